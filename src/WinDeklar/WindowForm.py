@@ -1,13 +1,18 @@
 #!/usr/bin/env python
 import functools
+import math
+from concurrent.futures import ThreadPoolExecutor
 import sys
+import time
 import matplotlib.pyplot as plt
+import numpy as np
 from matplotlib.figure import Figure
-from matplotlib import animation
-from PyQt5 import QtGui, QtWidgets
+from PyQt5 import QtCore, QtGui, QtWidgets
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 
 from WinDeklar.EditableScene import EditableFigure
+import WinDeklar.animation_aux as an
+import WinDeklar.graph_aux as ga
 import WinDeklar.points_box as pb
 import WinDeklar.QTAux as QTAux
 import WinDeklar.record as rc
@@ -35,6 +40,9 @@ class ConfigurableWindow(QtWidgets.QMainWindow):
         - a config_file_name is a yaml that has the definition (see view_example.yaml)
         - a typical windows has some widgets in the left and a Figure in the right (like a graph or a map)
     """
+    sync_animation_key   = 'synchronized_animation'
+    target_fps_key       = 'target_fps'
+    coalesce_refresh_key = 'coalesce_refresh'
 
     def __init__(self, win_config, provider):
         """
@@ -50,6 +58,9 @@ class ConfigurableWindow(QtWidgets.QMainWindow):
         self.provider.set_main_window(self)
 
         self.win_config = win_config
+        # refresh in the next turn of the event loop, merging all the changes until then (see request_refresh)
+        self.coalesce_refresh = self.win_config.get(self.coalesce_refresh_key, False)
+        self.refresh_pending  = False
 
         # status bar logic
         self.statusbar    = create_status_bar(self.win_config, self)
@@ -82,6 +93,11 @@ class ConfigurableWindow(QtWidgets.QMainWindow):
         self.FRAME.setLayout(self.LAYOUT)
         self.setCentralWidget(self.FRAME)
 
+        # all the animated figures can be driven by just one clock
+        self.animation_clock = None
+        if self.win_config.get(self.sync_animation_key, False):
+            self.animation_clock = create_animation_clock(self.fig_views, self.win_config.get(self.target_fps_key))
+
         self.provider.initialize()
         self.refresh()
         self.show()
@@ -99,9 +115,8 @@ class ConfigurableWindow(QtWidgets.QMainWindow):
         return self.provider.widget_has_value(name)
 
     def set_widget_value(self, name, value):
-        self.provider.set_value(name, value)
+        self.provider.set_value(name, value)  # it already refreshes the widgets and the figures
         self.refresh_other_widgets(name)
-        self.refresh()
 
     def set_widget_min_max(self, widget_name, min_value, max_value):
         widget = self.get_widget_by_name(widget_name)
@@ -122,6 +137,35 @@ class ConfigurableWindow(QtWidgets.QMainWindow):
         # initial values can be set before fig_view was created
         [figure.update_figure() for figure in self.fig_views]
 
+    def request_refresh(self):
+        """
+        Refresh the widgets and figures, if coalesce_refresh is set the refresh is done in the next turn of the event
+        loop, so a burst of changes (ex: dragging a slider) is shown with just one refresh
+        :return:
+        """
+        if not self.coalesce_refresh:
+            self.refresh_widgets()
+            self.refresh()
+            return
+        if self.refresh_pending:
+            return
+        self.refresh_pending = True
+        QtCore.QTimer.singleShot(0, self.flush_refresh)
+
+    def flush_refresh(self):
+        self.refresh_pending = False
+        self.refresh_widgets()
+        self.refresh()
+
+    def invalidate_figures(self, name=None):
+        """
+        Forces the figures (or just the one with that name) to be redrawn in the next refresh
+        :param name:
+        :return:
+        """
+        [figure.invalidate() for figure in self.fig_views
+         if isinstance(figure, FigureView) and (name is None or figure.name == name)]
+
     def refresh_widgets(self):
         for widget in self.widgets:
             widget.refresh()
@@ -159,10 +203,26 @@ class ConfigurableWindow(QtWidgets.QMainWindow):
 
     def start_animations(self):
         [figure.start_animation() for figure in self.fig_views]
+        if self.animation_clock is not None:
+            self.animation_clock.start()
 
     def stop_animations(self):
+        if self.animation_clock is not None:
+            self.animation_clock.stop()
         [figure.stop_animation() for figure in self.fig_views]
 
+    def get_animation_stats(self):
+        if self.animation_clock is not None:
+            return {figure.name: self.animation_clock.get_figure_stats(i)
+                    for i, figure in enumerate(self.animation_clock.figures)}
+        return {figure.name: figure.get_animation_stats() for figure in self.fig_views
+                if isinstance(figure, FigureView) and figure.anim is not None}
+
+    def closeEvent(self, event):
+        self.stop_animations()  # no frame can use the data providers once they are released
+        [figure.release() for figure in self.fig_views if isinstance(figure, FigureView)]
+        super(ConfigurableWindow, self).closeEvent(event)
+
     def show_status_bar_msg(self, msg):
         if self.statusbar is None:
             print('No status bar defined')
@@ -182,6 +242,20 @@ class FigureView(FigureCanvas):
     y_axis_key      = 'y_axis'
     axes_limits_key = 'axes_limits'
     text_pos_key    = 'text_position'
+    strip_chart_key = 'strip_chart'
+    scroll_step_key = 'scroll_step'
+    decimation_key  = 'decimation'
+    per_pixel_key   = 'points_per_pixel'
+    target_fps_key  = 'target_fps'
+    depends_on_key  = 'depends_on'
+    auto_depends_on = 'auto'  # depends_on value to discover the values used (read in update_view or compute_view)
+    min_interval_key = 'min_interval'
+    mouse_interval_key = 'mouse_move_interval'
+    retained_key    = 'retained'
+    async_key       = 'async_update'
+    record_key      = 'record'
+    statistics_key  = 'statistics'
+    pyramid_key     = 'pyramid'
 
     def __init__(self, parent, config, size=(1, 1), scaled=True, x_visible=True, y_visible=True):
 
@@ -214,6 +288,7 @@ class FigureView(FigureCanvas):
             [self.x_lower, self.x_upper, self.y_lower, self.y_upper] = axes_limits
 
         self.x_visible, self.y_visible = [x_visible, y_visible]
+        self.axis_state = None  # what set_axis applied (see set_axis)
         self.scaled = False if self.subtype == self.animation_key else scaled
 
         self.set_axis()
@@ -228,13 +303,67 @@ class FigureView(FigureCanvas):
 
         self.figure.canvas.mpl_connect('button_press_event', self.onclick)
         self.figure.canvas.mpl_connect('motion_notify_event', self.on_mouse_move)
+        # mouse moves are handled at most once every mouse_interval (milliseconds), the last one wins
+        self.mouse_interval = config.get(self.mouse_interval_key, 20)
+        self.last_move      = None   # time the last mouse move was handled
+        self.pending_move   = None   # last mouse move event not handled yet
+        self.move_timer     = QtCore.QTimer()
+        self.move_timer.setSingleShot(True)
+        self.move_timer.timeout.connect(self.flush_mouse_move)
 
         dec         = 0.95
         self.text_x = - width * dec
         self.text_y = height  * dec
 
+        # state values the figure depends on, if given the figure is updated only when some of them changes
+        self.depends_on = config.get(self.depends_on_key, None)
+        if self.depends_on is None:
+            self.depends_on = self.parent.provider.figure_depends_on(self)
+        self.track_depends_on = self.depends_on == self.auto_depends_on
+        if self.track_depends_on:
+            self.depends_on = None  # known after the first update
+        self.rendered_inputs = None  # values of depends_on when the figure was updated
+
+        # retained mode: the axes are not cleared before update_view, the artists are created once (see line) and
+        # changed in each update
+        self.retained        = config.get(self.retained_key, False)
+        self.clear_requested = True
+        self.named_artists   = {}
+
+        # async update: the model computes the view in a worker thread (compute_view) and then it is drawn in the GUI
+        # thread (apply_view), only the result of the last request is drawn
+        self.async_update    = config.get(self.async_key, False)
+        self.executor        = None
+        self.future          = None
+        self.generation      = 0     # number of the last request
+        self.applied         = 0     # number of the last result drawn
+        self.requested_inputs = None  # values of depends_on of the last request
+        self.requested_state = None  # StateSnapshot of the last request, when depends_on is auto
+        self.busy_text       = None
+        self.view_computed   = None
+
+        # min time (in milliseconds) between updates, the ones asked before are done when it is reached
+        self.min_interval   = config.get(self.min_interval_key, 0)
+        self.last_update    = None
+        self.update_pending = False
+
         # animation logic
+        anim_config        = config.get(self.animation_key, {})
+        self.strip_chart   = anim_config.get(self.strip_chart_key, False)  # blit lines, scroll in jumps
+        self.scroll_step   = anim_config.get(self.scroll_step_key, 0.1)    # jump size (as a fraction of the x-axis)
+        self.decimation    = anim_config.get(self.decimation_key, None)    # None, 'minmax' or 'lttb'
+        self.pixel_points  = anim_config.get(self.per_pixel_key, 2)        # max points per pixel when decimating
+        self.record_name   = anim_config.get(self.record_key, None)       # file to record the values shown
+        self.statistics    = anim_config.get(self.statistics_key, None)   # bands config: window, k and envelope
+        self.bands         = []    # StatisticsBands of each graph line (see initialize_graph_lines)
+        self.pyramid       = anim_config.get(self.pyramid_key, None)      # factor of the whole history pyramid
+        self.pyramids      = []    # PyramidSignalHistory of each graph line, keep all the values
+        self.recorders     = []    # SignalRecorder of each group of lines that share the time
+        self.background    = None  # what is behind the lines when blitting (see on_draw)
+        self.synchronized  = False  # True when the window's AnimationClock drives the animation
         self.graph_lines   = None  # set to None to signal graph are not initialized yet
+        self.signals       = []    # values of each group of graph lines that share the time (see get_time_groups)
+        self.time_groups   = []    # indexes of the graph lines of each group
         self.data_provider = None
         self.graph_bounds  = None
         self.points_in_graph = 0
@@ -246,30 +375,101 @@ class FigureView(FigureCanvas):
                 raise Exception(
                     'Figure is defined as "animation" but not data provider is given, implement get_data_provider() '
                     'in provider ')
-            self.anim = animation.FuncAnimation(self.figure, self.update_frame, frames=None, interval=interval,
-                                                blit=False)
+            # the data providers report the values lost (ex: ThreadedDataProvider) with the figure's communicate
+            self.values_lost = QTAux.Communicate()
+            self.values_lost.data_signal.connect(self.values_dropped)
+            for dp in self.data_provider:
+                if dp.communicate is None:
+                    dp.communicate = self.values_lost
+                else:
+                    dp.communicate.data_signal.connect(self.values_dropped)
+            self.figure.canvas.mpl_connect('draw_event', self.on_draw)
+            if self.pyramid is not None:
+                self.axes.callbacks.connect('xlim_changed', self.on_xlim_changed)
+            self.anim = an.FrameScheduler(self.animate, interval=interval,
+                                          target_fps=anim_config.get(self.target_fps_key, None))
+            [dp.start() for dp in self.data_provider]
+            self.anim.start()
 
     # Drawing
     def clear(self):
         if self.anim is not None:
             # in case of animation do not change axes limits, anim itself does it
             return
+        if self.retained and not self.clear_requested:
+            self.set_axis()
+            return
 
         self.axes.clear()
+        self.named_artists   = {}
+        self.clear_requested = False
+        self.axis_state      = None
         self.set_axis()
 
+    def request_clear(self):
+        """
+        In retained mode, the axes (and all the artists) are cleared before the next update
+        :return:
+        """
+        self.clear_requested = True
+        self.invalidate()
+
+    # Retained artists: created the first time they are asked, the same artist is returned after
+    def artist(self, name, create):
+        """
+        Returns the artist with that name, creating it (and adding it to the axes) the first time
+        :param name:
+        :param create: function without parameters that returns a new artist already added to the axes
+        :return:
+        """
+        artist = self.named_artists.get(name, None)
+        if artist is None:
+            artist = create()
+            self.named_artists[name] = artist
+        return artist
+
+    def line(self, name, **kwargs):
+        """
+        Returns the line with that name, change it with set_data
+        :param name:
+        :param kwargs: Line2D properties used when it is created (ex: color)
+        :return:
+        """
+        return self.artist(name, lambda: self.axes.plot([], [], **kwargs)[0])
+
+    def text(self, name, x=0.0, y=0.0, **kwargs):
+        """
+        Returns the text with that name, change it with set_text (and set_position)
+        :param name:
+        :param x:
+        :param y:
+        :param kwargs: Text properties used when it is created (ex: fontsize)
+        :return:
+        """
+        return self.artist(name, lambda: self.axes.text(x, y, '', **kwargs))
+
+    def remove_artist(self, name):
+        artist = self.named_artists.pop(name, None)
+        if artist is not None:
+            artist.remove()
+
     def set_axis(self):
         if self.anim is not None:
             # in case of animation do not change axes limits, anim itself does it
             return
 
-        if self.scaled:
-            self.axes.axis('scaled')
-
         axes_limits = self.box_size.size() if not self.box_size.is_empty else None
-
         if axes_limits is not None:
             self.x_lower, self.x_upper, self.y_lower, self.y_upper = axes_limits
+        state = [self.scaled, self.x_visible, self.y_visible, self.x_axis_name, self.y_axis_name]
+        if state == self.axis_state and self.axes.get_xbound() == (self.x_lower, self.x_upper) and \
+                self.axes.get_ybound() == (self.y_lower, self.y_upper):
+            return  # nothing changed
+        self.axis_state = state
+
+        if self.scaled:
+            self.axes.axis('scaled')
+
         self.axes.set_xbound(lower=self.x_lower, upper=self.x_upper)
         self.axes.set_ybound(lower=self.y_lower, upper=self.y_upper)
         self.axes.get_xaxis().set_visible(self.x_visible)
@@ -297,10 +497,136 @@ class FigureView(FigureCanvas):
         self.box_size.set_bounds(self.axes, inc)
 
     def update_figure(self):
+        inputs = self.get_inputs()
+        if inputs is not None and same_values(inputs, self.requested_inputs if self.async_update else
+                                              self.rendered_inputs):
+            return
+        if self.min_interval > 0 and self.last_update is not None:
+            wait = self.min_interval - (time.perf_counter() - self.last_update)*1000.0
+            if wait > 0:
+                if not self.update_pending:
+                    self.update_pending = True
+                    QtCore.QTimer.singleShot(int(math.ceil(wait)), self.pending_update)
+                return
+        self.last_update = time.perf_counter()
+        if self.async_update:
+            self.request_view(inputs)
+            return
         self.clear()
-        self.parent.provider.update_view(self, self.axes)
-        self.parent.provider.apply_zoom()
+        provider = self.parent.provider
+        if self.track_depends_on:
+            provider.start_reads_tracking()
+            try:
+                provider.update_view(self, self.axes)
+            finally:
+                self.depends_on = sorted(provider.stop_reads_tracking())
+            inputs = self.get_inputs()
+        else:
+            provider.update_view(self, self.axes)
+        provider.apply_zoom()
         self.draw()
+        self.rendered_inputs = inputs
+
+    def pending_update(self):
+        self.update_pending = False
+        self.update_figure()
+
+    # Async update
+    def request_view(self, inputs):
+        """
+        Asks the model to compute the view in a worker thread, with a copy of the current state
+        Notes:
+            - a request not started yet is cancelled by a new one, the result of one started is dropped when it ends
+            - while computing, the figure shows a busy indicator
+            - if depends_on is auto, the values read by compute_view in the state given are the ones it depends on
+        :param inputs: values of depends_on
+        :return:
+        """
+        if self.executor is None:
+            self.executor      = ThreadPoolExecutor(max_workers=1)
+            self.view_computed = QTAux.Communicate()
+            self.view_computed.data_signal.connect(self.on_view_computed)
+        if self.future is not None:
+            self.future.cancel()
+
+        self.generation      += 1
+        self.requested_inputs = inputs
+        generation = self.generation
+        provider   = self.parent.provider
+        state      = provider.get_state_snapshot()
+        if self.track_depends_on:
+            state = StateSnapshot(state)
+            self.requested_state = state
+        self.future = self.executor.submit(provider.compute_view, self.name, state)
+        # emitted in the worker thread, received in the GUI thread
+        self.future.add_done_callback(lambda future: self.view_computed.data_signal.emit([generation, future]))
+        self.show_busy(True)
+
+    def on_view_computed(self, values):
+        """
+        Event triggered (in the GUI thread) when the view of a request was computed
+        :param values: [request number, future]
+        :return:
+        """
+        generation, future = values
+        if generation != self.generation or generation <= self.applied or future.cancelled():
+            return  # there is a newer request (or it was already drawn, see wait_view)
+        self.applied = generation
+        self.show_busy(False)
+        if future.exception() is not None:
+            self.parent.provider.show_status_bar_msg('Error computing %s: %s' % (self.name, future.exception()))
+            return
+        if self.track_depends_on:
+            self.depends_on       = sorted(self.requested_state.read_names)
+            self.requested_inputs = self.requested_state.get_inputs(self.depends_on) + \
+                [self.parent.provider.zoom_active(), self.parent.provider.zoom_center]
+        self.clear()
+        self.parent.provider.apply_view(self, self.axes, future.result())
+        self.parent.provider.apply_zoom()
+        self.draw_idle()
+        self.rendered_inputs = self.requested_inputs
+
+    def wait_view(self, timeout=None):
+        """
+        Waits for the last request and draws its result (ex: when there is no event loop, see headless)
+        :param timeout: in seconds, None means no limit
+        :return:
+        """
+        if self.future is None:
+            return
+        future = self.future
+        try:
+            future.result(timeout=timeout)
+        except Exception:
+            pass  # shown by on_view_computed
+        self.on_view_computed([self.generation, future])
+
+    def show_busy(self, busy):
+        if self.busy_text is None:
+            # in the figure (not in the axes), so it is not removed by clear
+            self.busy_text = self.figure.text(0.99, 0.01, 'computing...', ha='right', va='bottom', color='Gray',
+                                              fontsize='small')
+        self.busy_text.set_visible(busy)
+        self.draw_idle()
+
+    def get_inputs(self):
+        """
+        Returns the values the figure depends on (including the zoom), None if they are not known
+        :return:
+        """
+        if self.depends_on is None:
+            return None
+        provider = self.parent.provider
+        return [provider.get_value(name) for name in self.depends_on] + [provider.zoom_active(), provider.zoom_center]
+
+    def invalidate(self):
+        """
+        Forces the next update_figure to redraw, needed when the figure changes because of something not in
+        depends_on (ex: a value modified in place)
+        :return:
+        """
+        self.rendered_inputs  = None
+        self.requested_inputs = None
 
     def text_position(self):
         if self.text_pos is not None:
@@ -323,14 +649,36 @@ class FigureView(FigureCanvas):
 
     # Events
     def onclick(self, event):
+        self.flush_mouse_move()  # the moves before the click are handled first
         self.parent.provider.on_mouse_click(event, self.axes, self)
         self.set_axis()
-        self.draw()
+        self.draw_idle()
 
     def on_mouse_move(self, event):
+        """
+        Motion events arrive hundreds of times per second, they are handled at most once every mouse_interval
+        (the last event wins), the rest are discarded
+        :param event:
+        :return:
+        """
+        self.pending_move = event
+        if self.move_timer.isActive():
+            return
+        wait = 0.0 if self.last_move is None else self.mouse_interval - (time.perf_counter() - self.last_move)*1000.0
+        if wait <= 0:
+            self.flush_mouse_move()
+        else:
+            self.move_timer.start(int(math.ceil(wait)))
+
+    def flush_mouse_move(self):
+        self.move_timer.stop()
+        event, self.pending_move = self.pending_move, None
+        if event is None:
+            return
+        self.last_move = time.perf_counter()
         if self.parent.provider.on_mouse_move(event, self.axes):
             self.set_axis()
-            self.draw()
+            self.draw_idle()
 
     def popup_context_menu(self, actions=(), update_figure=True):
         """
@@ -345,26 +693,164 @@ class FigureView(FigureCanvas):
         context_menu = QTAux.Menu(self, actions=actions)
         context_menu.popup()
         if update_figure:
+            self.invalidate()
             self.update_figure()
 
     # Animation
+    def animate(self, frame_number):
+        """
+        Shows the next frame, called by the FrameScheduler
+        :param frame_number:
+        :return:
+        """
+        self.update_frame(frame_number)
+        self.render_frame()
+
+    def render_frame(self, repaint=True):
+        """
+        Draws the graph lines, in a strip chart only the lines are drawn over the background (blitting), otherwise
+        the whole figure
+        Note: the draw is synchronous, so FrameScheduler knows the real cost of each frame
+        :param repaint: whether to repaint the widget now or let Qt do it with the others (see AnimationClock)
+        :return:
+        """
+        if not self.strip_chart or self.graph_lines is None:
+            self.draw()  # the widget is repainted later by Qt
+            return
+        if self.background is None:
+            self.draw()  # on_draw keeps the background
+        self.restore_region(self.background)
+        self.draw_lines()
+        if repaint:
+            self.blit(self.axes.bbox)
+        else:
+            self.update()
+
+    def draw_lines(self):
+        for bands in self.bands:
+            [self.axes.draw_artist(artist) for artist in bands.artists]
+        for [line, _] in self.graph_lines:
+            self.axes.draw_artist(line)
+
+    def on_draw(self, _):
+        """
+        Event triggered after the whole figure is drawn, in a strip chart the lines are animated (the figure does not
+        draw them), so it is the background to use when blitting
+        :return:
+        """
+        if not self.strip_chart or self.graph_lines is None:
+            return
+        self.background = self.copy_from_bbox(self.axes.bbox)
+        self.draw_lines()
+
     def update_frame(self, frame_number):
+        """
+        Adds the new values to the graph lines
+        :param frame_number:
+        :return: the lines changed (used when blitting)
+        """
         # first time do initializations
         if self.graph_lines is None:
             self.initialize_graph_lines(self.graph_bounds, self.data_provider)
 
         self.anim_is_running = True
-        # update graphs
-        for [line, dp, xs, ys] in self.graph_lines:
-            x, y = dp.get_next_values(frame_number)
-            # print(' frame:%s x:%s y:%s' % (frame, x, y))
-            xs.append(x)
-            ys.append(y)
-
-            x_max = xs.max()
-            if x_max > self.graph_bounds[1]:
-                self.axes.set_xlim(x_max - self.graph_bounds[1], x_max)
-            line.set_data(xs.values, ys.values)
+        lines = [line for [line, _] in self.graph_lines]
+        # update graphs with all the values produced since the last frame, each group of lines with its own times
+        for g, [xs, ys] in enumerate(self.get_next_values()):
+            # print(' frame:%s lines:%s values:%s' % (frame_number, self.time_groups[g], len(xs)))
+            self.signals[g].append_rows(xs, ys)
+            if self.recorders:
+                self.recorders[g].append_rows(xs, ys)
+            group = self.time_groups[g]
+            for channel, i in enumerate(group):
+                if self.bands:
+                    self.bands[i].append(xs, ys[channel])
+                if self.pyramids:
+                    self.pyramids[i].append_rows(xs, ys[channel])
+        last_times = [signals.last_time() for signals in self.signals if signals.get_count() > 0]
+        if not last_times:
+            return lines
+
+        self.scroll(max(last_times))
+        max_points = int(self.axes.bbox.width*self.pixel_points)
+        if self.pyramids:
+            self.set_lines_from_pyramids()
+            # the lines have max_points at most
+            [bands.update_artists(max_points, self.decimation or 'minmax') for bands in self.bands]
+            return lines
+
+        for group, signals in zip(self.time_groups, self.signals):
+            xs = signals.get_time()
+            for channel, i in enumerate(group):
+                ys = signals.get_channel(channel)
+                if self.decimation is not None:
+                    lines[i].set_data(*ga.decimate(xs, ys, max_points, method=self.decimation))
+                else:
+                    lines[i].set_data(xs, ys)
+        if self.decimation is not None:
+            [bands.update_artists(max_points, self.decimation) for bands in self.bands]
+        else:
+            [bands.update_artists() for bands in self.bands]
+        return lines
+
+    def set_lines_from_pyramids(self):
+        """
+        Shows in each line the values of the x-axis range, at the resolution of the figure width
+        :return:
+        """
+        x_min, x_max = self.axes.get_xlim()
+        max_points   = int(self.axes.bbox.width*self.pixel_points)
+        for [line, _], pyramid in zip(self.graph_lines, self.pyramids):
+            line.set_data(*pyramid.get_range(x_min, x_max, max_points))
+
+    def on_xlim_changed(self, _):
+        """
+        Event triggered when the x-axis range changes, when the animation is stopped (ex: zooming to see the whole
+        history) the lines must be taken from the pyramids again
+        :return:
+        """
+        if self.anim_is_running or not self.pyramids:
+            return  # in the next frame
+        self.set_lines_from_pyramids()
+        self.background = None
+        self.draw_idle()
+
+    def scroll(self, x_max):
+        """
+        Moves the x-axis so x_max is visible
+            - normally the axis moves in every frame, so x_max is always at the right
+            - in a strip chart it jumps scroll_step ahead, so the whole figure (ticks, labels, etc.) is only redrawn
+              once in a while, the rest of the frames just the lines are blitted
+        :param x_max:
+        :return:
+        """
+        width = self.graph_bounds[1]
+        if not self.strip_chart:
+            if x_max > width:
+                self.axes.set_xlim(x_max - width, x_max)
+            return
+
+        _, upper = self.axes.get_xlim()
+        if x_max <= upper:
+            return
+        upper = x_max + self.scroll_step*width
+        self.axes.set_xlim(upper - width, upper)
+        self.background = None  # the whole figure must be drawn again
+
+    def get_next_values(self):
+        """
+        Returns the values produced by every data provider since the last frame
+        Note: in each group the first data provider gives the times, the others just the values for them; the ones that
+              run at their own rate (ex: ThreadedDataProvider) are alone in their group, so all the values are shown
+              (nothing is kept for the next frame)
+        :return: list of [xs, ys], one per time group (ys has a row per data provider of the group)
+        """
+        values = []
+        for group in self.time_groups:
+            xs, ys = self.graph_lines[group[0]][1].get_available_values()
+            rows   = [ys] + [self.graph_lines[i][1].get_available_values(len(xs))[1] for i in group[1:]]
+            values.append([xs, np.array(rows, dtype=np.float64).reshape(len(group), len(xs))])
+        return values
 
     def initialize_graph_lines(self, bounds, data_provider):
         """
@@ -373,13 +859,28 @@ class FigureView(FigureCanvas):
         :param data_provider:
         :return:
         """
-        # Create a line for each data provider
+        # Create a line for each data provider, the values of the ones that share the time are kept in just one buffer
         self.graph_lines = []
         for dp in data_provider:
-            line, = self.axes.plot([], [], color=dp.color)
-            xs = sg.SignalHistory(self.points_in_graph)
-            ys = sg.SignalHistory(self.points_in_graph)
-            self.graph_lines.append([line, dp, xs, ys])
+            line, = self.axes.plot([], [], color=dp.color, animated=self.strip_chart)
+            self.graph_lines.append([line, dp])
+        self.time_groups = get_time_groups(data_provider)
+        self.signals     = [sg.MultiSignalHistory(self.points_in_graph, channels=len(group))
+                            for group in self.time_groups]
+        # A file for each group of lines that share the time (record_name_<group> if there are several), channel i of
+        # a file is the i-th line of its group
+        if self.record_name is not None:
+            self.recorders = [rc.SignalRecorder(self.record_name if len(self.time_groups) == 1 else
+                                                '%s_%s' % (self.record_name, i), channels=len(group))
+                              for i, group in enumerate(self.time_groups)]
+        if self.pyramid is not None:
+            self.pyramids = [sg.PyramidSignalHistory(factor=self.pyramid) for _ in data_provider]
+        if self.statistics is not None:
+            self.bands = [ga.StatisticsBands(self.axes, self.points_in_graph, window=self.statistics.get('window', 20),
+                                             k=self.statistics.get('k', 2.0),
+                                             envelope=self.statistics.get('envelope', True), color=dp.color,
+                                             animated=self.strip_chart)
+                          for dp in data_provider]
 
         # Set the axis limits
         min_x, max_x     = bounds
@@ -394,18 +895,60 @@ class FigureView(FigureCanvas):
                 max_y = max_y1
         self.axes.set_ylim(min_y, max_y)
 
+    def values_dropped(self, values):
+        """
+        Event triggered (in the GUI thread) when a data provider lost values
+        :param values: [data_provider, number of values lost]
+        :return:
+        """
+        data_provider, dropped = values
+        self.parent.provider.on_values_dropped(self, data_provider, dropped)
+
+    def set_synchronized(self):
+        """
+        The animation is driven by the window's AnimationClock instead of its own FrameScheduler
+        :return:
+        """
+        self.synchronized = True
+        self.anim.stop()
+
+    def release(self):
+        """
+        Frees what the figure uses besides the widget, called when the window is closed
+        :return:
+        """
+        if self.executor is not None:
+            self.future.cancel()  # if not started yet
+            self.generation += 1  # the result of a running one is dropped
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        [recorder.close() for recorder in self.recorders]
+        if self.data_provider is not None:
+            [dp.close() for dp in self.data_provider]
+
     def stop_animation(self):
         if self.anim is None:
             return
-        self.anim.event_source.stop()
+        self.anim.stop()
+        [dp.stop() for dp in self.data_provider]
+        [recorder.flush() for recorder in self.recorders]
         self.anim_is_running = False
 
     def start_animation(self):
         if self.anim is None:
             return
-        self.anim.event_source.start()
+        [dp.start() for dp in self.data_provider]
+        if not self.synchronized:
+            self.anim.start()
         self.anim_is_running = True
 
+    def get_animation_stats(self):
+        """
+        Returns the performance of the animation (see FrameScheduler.get_stats)
+        :return: dict with fps, frame_cost and dropped_frames (None if it is not an animated figure)
+        """
+        return self.anim.get_stats() if self.anim is not None else None
+
 
 class SimpleFigure:
     """
@@ -529,6 +1072,7 @@ class HostModel(object):
 
         self._state      = initial_values if initial_values is not None else {}
         self.main_window = None
+        self.read_names  = None  # names used by get_value while tracking (see start_reads_tracking)
 
         self.zoom_center = None   # point where to center Zoom
         self.zoom_radius = 10.0   # radius around
@@ -544,8 +1088,7 @@ class HostModel(object):
         """
         if self.main_window is None:
             return
-        self.main_window.refresh_widgets()
-        self.main_window.refresh()
+        self.main_window.request_refresh()
 
     def refresh_figures(self):
         """
@@ -557,6 +1100,17 @@ class HostModel(object):
             return
         self.main_window.redraw_figures()
 
+    def invalidate_figures(self, name=None):
+        """
+        Forces the figures (or just the one with that name) to be redrawn in the next refresh, even if the values they
+        depend on did not change (see figure_depends_on)
+        :param name: figure name (None means all)
+        :return:
+        """
+        if self.main_window is None:
+            return
+        self.main_window.invalidate_figures(name)
+
     def refresh_widgets(self):
         """
         Refresh all widgets
@@ -665,6 +1219,8 @@ class HostModel(object):
         :param default:
         :return:
         """
+        if self.read_names is not None:
+            self.read_names.add(name)
         if name in self._state:
             return self._state[name]
         else:
@@ -677,6 +1233,20 @@ class HostModel(object):
     def widget_has_value(self, name):
         return name in self._state
 
+    def start_reads_tracking(self):
+        """
+        Starts keeping the names of the values read with get_value (used to know the values a figure depends on)
+        :return:
+        """
+        self.read_names = set()
+
+    def stop_reads_tracking(self):
+        """
+        :return: the names of the values read since start_reads_tracking
+        """
+        names, self.read_names = self.read_names, None
+        return names
+
     def widgets_def(self):
         """
         Abstract method
@@ -750,6 +1320,47 @@ class HostModel(object):
         """
         pass
 
+    def compute_view(self, figure_name, state):
+        """
+        Computes what a Figure defined with async_update shows, it runs in a worker thread, so the form is not frozen
+        while it runs (the result is drawn by apply_view)
+        Abstract method
+        Note: it must not use widgets, figures or get_value, just the state given
+        :param figure_name:
+        :param state: copy of the values when the update was asked (dict)
+        :return: anything apply_view needs (ex: the points to graph)
+        """
+        return None
+
+    def apply_view(self, figure, ax, data):
+        """
+        Draws the result of compute_view, in the GUI thread (results of outdated requests are dropped)
+        Abstract method
+        :param figure:
+        :param ax:
+        :param data: returned by compute_view
+        :return:
+        """
+        pass
+
+    def get_state_snapshot(self):
+        """
+        Returns a copy of the values (used by compute_view)
+        Note: the copy is shallow, values changed in place (ex: lists) are shared
+        :return:
+        """
+        return dict(self._state)
+
+    def figure_depends_on(self, figure):
+        """
+        Returns the names of the values used by update_view for a Figure (used when depends_on is not in the
+        definition file), so the figure is only updated when some of them changes
+        Abstract method
+        :param figure:
+        :return: list of names, 'auto' (the ones read in update_view) or None (always updated)
+        """
+        return None
+
     # Zoom management
     def zoom_active(self):
         return self._state.get(self.zoom_key, False)
@@ -852,6 +1463,16 @@ class HostModel(object):
         max_points    = int(max_x/dt) + 1
         return interval, max_points, (min_x, max_x), data_provider
 
+    def on_values_dropped(self, figure, data_provider, dropped):
+        """
+        Event triggered when a data provider of an animated figure lost values (see ThreadedDataProvider)
+        :param figure:        :type FigureView
+        :param data_provider: the one that lost the values
+        :param dropped:       number of values lost
+        :return:
+        """
+        self.show_status_bar_msg('%s: %s values lost (%s in total)' % (figure.name, dropped, data_provider.dropped))
+
     def start_stop_animation(self):
         """
         Logit to start/stop the graph with only one button (who changes its title depending on the graph is
@@ -875,6 +1496,15 @@ class HostModel(object):
     def start_animation(self):
         self.main_window.start_animations()
 
+    def get_animation_stats(self):
+        """
+        Returns the performance of each animated figure, useful to show it in the status bar
+        :return: dict of figure name: {fps, frame_cost (milliseconds), dropped_frames}
+        """
+        if self.main_window is None:
+            return {}
+        return self.main_window.get_animation_stats()
+
 
 class PropertiesHost(HostModel):
     """
@@ -1083,6 +1713,95 @@ def set_figure_layout(father_layout, figure_config, window, subtype):
     return fig_view
 
 
+class StateSnapshot(dict):
+    """
+    Copy of the values given to compute_view that keeps the names read, so a Figure with async_update can also
+    discover what it depends on (depends_on: auto), as HostModel.get_value does for update_view
+    """
+
+    def __init__(self, state):
+        super(StateSnapshot, self).__init__(state)
+        self.read_names = set()
+
+    def __getitem__(self, name):
+        self.read_names.add(name)
+        return super(StateSnapshot, self).__getitem__(name)
+
+    def __contains__(self, name):
+        self.read_names.add(name)
+        return super(StateSnapshot, self).__contains__(name)
+
+    def get(self, name, default=None):
+        self.read_names.add(name)
+        return super(StateSnapshot, self).get(name, default)
+
+    def get_inputs(self, names):
+        """
+        Returns the values of names (without counting them as read)
+        :param names:
+        :return:
+        """
+        return [super(StateSnapshot, self).get(name) for name in names]
+
+
+def same_values(values, previous):
+    """
+    Whether two lists of values are equal (numpy arrays included)
+    :param values:
+    :param previous: None means unknown
+    :return:
+    """
+    if previous is None or len(values) != len(previous):
+        return False
+    for value, previous_value in zip(values, previous):
+        if value is previous_value:
+            continue
+        try:
+            if not bool(value == previous_value):
+                return False
+        except ValueError:
+            # comparing numpy arrays returns an array
+            if not np.array_equal(value, previous_value):
+                return False
+    return True
+
+
+def get_time_groups(data_provider):
+    """
+    Groups the data providers that produce the same times (see RealTimeDataProvider.shares_time)
+    :param data_provider: list of data providers
+    :return: list of groups, each one a list of indexes in data_provider
+    """
+    groups = []
+    for i, dp in enumerate(data_provider):
+        for group in groups:
+            first = data_provider[group[0]]
+            if dp.shares_time and first.shares_time and dp.dt == first.dt and dp.t == first.t:
+                group.append(i)
+                break
+        else:
+            groups.append([i])
+    return groups
+
+
+def create_animation_clock(fig_views, target_fps=None):
+    """
+    Returns an AnimationClock that drives all the animated figures (it ticks at the rate of the fastest one, unless
+    target_fps is given, and each figure gets a frame every its own interval), None if there are no animated figures
+    :param fig_views:
+    :param target_fps:
+    :return:
+    """
+    figures = [figure for figure in fig_views if isinstance(figure, FigureView) and figure.anim is not None]
+    if not figures:
+        return None
+    [figure.set_synchronized() for figure in figures]
+    intervals = [figure.anim.interval for figure in figures]
+    clock = an.AnimationClock(figures, interval=min(intervals), target_fps=target_fps, intervals=intervals)
+    clock.start()
+    return clock
+
+
 def create_menu_bar(config, main_window, provider, key='menu_bar'):
     if key not in config:
         return None
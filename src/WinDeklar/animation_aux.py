@@ -0,0 +1,174 @@
+import time
+
+from PyQt5 import QtCore
+
+
+class FrameScheduler(object):
+    """
+    Calls a function (usually the one that updates and draws a frame) at a target rate, adapting to its cost
+    Notes:
+        - a single shot timer is started again after each frame, so there is never more than one frame pending
+        - when a frame takes longer than the interval the next one is delayed a little more each time (backing off),
+          so the event loop has time to process the user input
+        - frames that could not be shown in time are counted as dropped; the data providers driven by the clock return
+          the samples due since the last frame (see RealTimeDataProvider.samples_due), so their data time is kept and
+          the frames are just coalesced, the ones with a fixed samples_per_frame slow down with the frames
+    """
+
+    def __init__(self, function, interval=100, target_fps=None, min_idle=5, max_idle=200, smooth=0.1):
+        """
+        :param function:   called with the frame number
+        :param interval:   time between frames (in milliseconds), only used if target_fps is None
+        :param target_fps: frames per second to reach
+        :param min_idle:   min time (in milliseconds) left to the event loop when frames are too slow
+        :param max_idle:   max time (in milliseconds) left to the event loop when backing off
+        :param smooth:     weight of the last frame in fps and frame_cost (exponential moving average)
+        """
+        self.function   = function
+        self.interval   = 1000.0/target_fps if target_fps else float(interval)
+        self.min_idle   = min_idle
+        self.max_idle   = max_idle
+        self.smooth     = smooth
+        self.idle       = min_idle
+        self.is_running = False
+
+        self.frame_number   = 0
+        self.fps            = 0.0   # frames per second achieved
+        self.frame_cost     = 0.0   # time (in milliseconds) to update and draw a frame
+        self.dropped_frames = 0
+        self.last_start     = None
+
+        self.timer = QtCore.QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.on_timer)
+
+    def start(self):
+        self.is_running = True
+        self.last_start = None  # time while stopped does not count
+        self.timer.start(0)
+
+    def stop(self):
+        self.is_running = False
+        self.timer.stop()
+
+    def on_timer(self):
+        started = time.perf_counter()
+        if self.last_start is not None:
+            period = (started - self.last_start)*1000.0
+            self.fps = self.average(self.fps, 1000.0/period if period > 0 else 0.0)
+            missed   = int(period/self.interval) - 1
+            if missed > 0:
+                self.dropped_frames += missed
+        self.last_start = started
+
+        try:
+            self.function(self.frame_number)
+        finally:
+            self.frame_number += 1
+            cost            = (time.perf_counter() - started)*1000.0
+            self.frame_cost = self.average(self.frame_cost, cost)
+            if self.is_running:
+                self.timer.start(int(self.next_delay(cost)))
+
+    def next_delay(self, cost):
+        """
+        Returns the time to wait (in milliseconds) before the next frame
+        :param cost: time used by the last frame
+        :return:
+        """
+        if cost < self.interval:
+            self.idle = self.min_idle
+            return self.interval - cost
+        # behind schedule: back off
+        self.idle = min(self.idle*2, self.max_idle)
+        return self.idle
+
+    def average(self, current, value):
+        return value if current == 0.0 else current + self.smooth*(value - current)
+
+    def get_stats(self):
+        """
+        Returns the performance of the animation
+        :return: dict with fps, frame_cost (milliseconds) and dropped_frames
+        """
+        return {'fps': self.fps, 'frame_cost': self.frame_cost, 'dropped_frames': self.dropped_frames}
+
+
+class AnimationClock(FrameScheduler):
+    """
+    Drives all the animated figures of a window with just one timer, so they stay in lockstep
+    On each tick the figures whose interval has passed are updated first and then drawn, without repainting the
+    widgets one by one (Qt repaints all of them in a single pass)
+    Notes:
+        - the clock ticks at the rate of the fastest figure, each figure still gets a frame every its own interval
+          (its data providers produce the values of a frame in each update, so otherwise the time of the slower
+          figures would run faster than configured)
+        - the performance is also kept for each figure (see get_figure_stats), as they do not get the same frames
+    """
+
+    def __init__(self, figures, interval=100, target_fps=None, intervals=None):
+        """
+        :param figures:    list of animated FigureView
+        :param interval:   time between frames (in milliseconds), only used if target_fps is None
+        :param target_fps: frames per second to reach
+        :param intervals:  time between frames (in milliseconds) of each figure, None means every tick
+        """
+        self.figures   = figures
+        self.intervals = intervals if intervals is not None else [0.0 for _ in figures]
+        self.frames         = [0 for _ in figures]     # frame number of each figure
+        self.due            = [None for _ in figures]  # time (in milliseconds) of the next frame of each figure
+        self.last_due       = [None for _ in figures]  # time (in milliseconds) of the last frame of each figure
+        self.figure_fps     = [0.0 for _ in figures]   # frames per second achieved by each figure
+        self.figure_cost    = [0.0 for _ in figures]   # time (in milliseconds) to update and draw each figure
+        self.figure_dropped = [0 for _ in figures]     # frames of each figure not shown in time
+        super(AnimationClock, self).__init__(self.tick, interval=interval, target_fps=target_fps)
+
+    def start(self):
+        self.due      = [None for _ in self.figures]  # time while stopped does not count
+        self.last_due = [None for _ in self.figures]
+        super(AnimationClock, self).start()
+
+    def tick(self, frame_number):
+        now     = time.perf_counter()*1000.0
+        figures = [i for i in range(len(self.figures)) if self.is_due(i, now)]
+        costs   = {}
+        for i in figures:
+            started = time.perf_counter()
+            self.figures[i].update_frame(self.frames[i])
+            self.frames[i] += 1
+            costs[i] = time.perf_counter() - started
+        for i in figures:
+            started = time.perf_counter()
+            self.figures[i].render_frame(repaint=False)
+            cost    = (costs[i] + time.perf_counter() - started)*1000.0
+            self.figure_cost[i] = self.average(self.figure_cost[i], cost)
+
+    def is_due(self, i, now):
+        """
+        Returns whether the interval of the figure i has passed, in such case its next frame is scheduled
+        :param i:
+        :param now: time in milliseconds
+        :return:
+        """
+        # the tick can come a little earlier than the interval (the timer is not exact), half the tick is tolerated
+        if self.due[i] is not None and now < self.due[i] - self.interval/2:
+            return False
+        if self.last_due[i] is not None:
+            period             = now - self.last_due[i]
+            self.figure_fps[i] = self.average(self.figure_fps[i], 1000.0/period if period > 0 else 0.0)
+            missed             = int(period/max(self.intervals[i], self.interval)) - 1
+            if missed > 0:
+                self.figure_dropped[i] += missed
+        self.last_due[i] = now
+        # frames not shown in time are not recovered (as in FrameScheduler)
+        self.due[i] = now + self.intervals[i] if self.due[i] is None or self.due[i] + self.intervals[i] < now else \
+            self.due[i] + self.intervals[i]
+        return True
+
+    def get_figure_stats(self, i):
+        """
+        Returns the performance of the animation of the figure i
+        :param i:
+        :return: dict with fps, frame_cost (milliseconds) and dropped_frames
+        """
+        return {'fps': self.figure_fps[i], 'frame_cost': self.figure_cost[i], 'dropped_frames': self.figure_dropped[i]}
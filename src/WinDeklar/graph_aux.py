@@ -1,28 +1,54 @@
+import bisect
 import numpy as np
-import random
 import math
+import operator
+import threading
+import time
+from collections import deque, OrderedDict
 import matplotlib.lines as mlines
+import matplotlib.collections as mcollections
+import matplotlib.colors as mcolors
+import matplotlib.patches as mpatches
+
+import WinDeklar.record as rc
+import WinDeklar.signal_aux as sg
 
 
 class RealTimeDataProvider(object):
     """
     Base class used displaying data in an animated graph
+    Note: the providers with shares_time produce the same times when they have the same dt (and start), so a figure
+          keeps their values in a single buffer (see FigureView.initialize_graph_lines), the ones that run at their own
+          rate (ex: in a thread) set it to False
     """
+    shares_time = True
 
-    def __init__(self, dt=0.1, min_y=0.0, max_y=10.0, color='Red'):
+    def __init__(self, dt=0.1, min_y=0.0, max_y=10.0, color='Red', samples_per_frame=None, max_samples=10000):
         """
 
-        :param dt:     delta time to increase in each cycle
+        :param dt:     delta time to increase in each cycle (time between samples)
         :param min_y:  min value in the y-axis
         :param max_y:  max value in the y-axis
         :param color:  color of the line in the graph
+        :param samples_per_frame: None produces in each frame the samples due since the last one (elapsed time/dt, so
+                                  the data time follows the clock whatever the frame rate), a number produces that many
+                                  samples every frame (the data time follows the frames, ex: to go as fast as possible)
+        :param max_samples: max samples produced by the clock in a frame, the older ones are skipped (ex: after the GUI
+                            was blocked for a while)
         """
 
-        self.min_y = min_y
-        self.max_y = max_y
-        self.color = color
-        self.dt    = dt
-        self.t     = 0.0     # current time
+        self.min_y  = min_y
+        self.max_y  = max_y
+        self.color  = color
+        self.dt     = dt
+        self.t      = 0.0     # current time
+        self.sample = 0       # number of samples produced
+        self.samples_per_frame = samples_per_frame
+        self.max_samples = max_samples
+        self.clock       = time.perf_counter  # returns the time in seconds (see headless.HeadlessRenderer)
+        self.clock_start = None  # clock time of the first sample, None until the first frame after start
+        self.dropped     = 0     # total number of values lost (see report_dropped)
+        self.communicate = None  # QTAux.Communicate used to report problems to the GUI, given by the figure
 
     def get_bounds(self):
         return self.min_y, self.max_y
@@ -44,31 +70,141 @@ class RealTimeDataProvider(object):
         y      = i
         return x, y
 
+    def start(self):
+        """
+        Called when the animation starts (or restarts)
+        :return:
+        """
+        self.clock_start = None  # the time stopped is not produced, the clock starts again in the next frame
+
+    def stop(self):
+        """
+        Called when the animation stops
+        Abstract method
+        :return:
+        """
+        pass
+
+    def close(self):
+        """
+        Called when the window is closed, frees what the provider uses (ex: shared memory)
+        :return:
+        """
+        self.stop()
+
+    def report_dropped(self, dropped):
+        """
+        Reports values lost with communicate.data_signal as [data_provider, values_lost] (it can be called from any
+        thread, the signal is received in the GUI one)
+        :param dropped: number of values lost
+        :return:
+        """
+        self.dropped += dropped
+        if self.communicate is not None:
+            self.communicate.data_signal.emit([self, dropped])
+
+    def samples_due(self):
+        """
+        Returns the number of samples to produce in this frame (see samples_per_frame)
+        :return:
+        """
+        if self.samples_per_frame is not None:
+            return self.samples_per_frame
+        now = self.clock()
+        if self.clock_start is None:
+            self.clock_start = now - self.sample*self.dt
+        due = int(math.floor((now - self.clock_start)/self.dt + 1e-9)) + 1 - self.sample
+        if due > self.max_samples:
+            self.skip(due - self.max_samples)
+            due = self.max_samples
+        return max(due, 0)
+
+    def skip(self, samples):
+        """
+        Advances the time without producing the samples
+        :param samples:
+        :return:
+        """
+        self.t      += self.dt*samples
+        self.sample += samples
+
+    def get_available_values(self, samples=None):
+        """
+        Returns all the points produced since the last frame
+        Subclasses should override it when the points can be calculated in a vectorized way
+        :param samples: number of points to return, None for the ones produced since the last frame (it is given to
+                        the providers that share the time with another one, so all of them return the same times)
+        :return: xs, ys :type numpy arrays
+        """
+        values = []
+        for _ in range(self.samples_due() if samples is None else samples):
+            values.append(self.get_next_values(self.sample))
+            self.sample += 1
+        if not values:
+            return np.zeros(0), np.zeros(0)
+        xs, ys = np.array(values, dtype=np.float64).T
+        return xs, ys
+
+    def next_times(self, samples):
+        """
+        Returns the time of the next samples (and advances the current time)
+        :param samples:
+        :return: :type numpy array
+        """
+        xs           = self.t + self.dt*np.arange(samples)
+        self.t      += self.dt*samples
+        self.sample += samples
+        return xs
+
+
+class SimulatedClock(object):
+    """
+    Clock that only advances when asked, used instead of the real one (see RealTimeDataProvider.clock) to produce the
+    values of each frame without waiting (ex: rendering offline)
+    """
+
+    def __init__(self, t=0.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+    def advance(self, seconds):
+        self.t += seconds
+
 
 class RealTimeRandomDataProvider(RealTimeDataProvider):
     """
     Returns a random number between min_y and max_y each time
     """
 
-    def __init__(self, dt=0.1, min_y=0.0, max_y=10.0, color='Red'):
-        super(RealTimeRandomDataProvider, self).__init__(dt=dt, min_y=min_y, max_y=max_y, color=color)
+    def __init__(self, dt=0.1, min_y=0.0, max_y=10.0, color='Red', samples_per_frame=None, max_samples=10000):
+        super(RealTimeRandomDataProvider, self).__init__(dt=dt, min_y=min_y, max_y=max_y, color=color,
+                                                         samples_per_frame=samples_per_frame, max_samples=max_samples)
 
     def get_next_values(self, i):
         x      = self.t
         self.t += self.dt
         return x, np.random.uniform(self.min_y, self.max_y)
 
+    def get_available_values(self, samples=None):
+        xs = self.next_times(self.samples_due() if samples is None else samples)
+        return xs, np.random.uniform(self.min_y, self.max_y, len(xs))
+
 
 class RealTimeFunctionDataProvider(RealTimeDataProvider):
     """
     Returns the result of applying a given function
     """
 
-    def __init__(self, dt=0.1, min_y=-1.2, max_y=1.2, function=np.sin, inc=np.radians(10), color='Red'):
+    def __init__(self, dt=0.1, min_y=-1.2, max_y=1.2, function=np.sin, inc=np.radians(10), color='Red',
+                 samples_per_frame=None, max_samples=10000):
         self.function = function
         self.inc      = inc
         self.last_r   = 0.0
-        super(RealTimeFunctionDataProvider, self).__init__(dt=dt, min_y=min_y, max_y=max_y, color=color)
+        super(RealTimeFunctionDataProvider, self).__init__(dt=dt, min_y=min_y, max_y=max_y, color=color,
+                                                           samples_per_frame=samples_per_frame,
+                                                           max_samples=max_samples)
 
     def get_next_values(self, i):
         x      = self.t
@@ -77,14 +213,30 @@ class RealTimeFunctionDataProvider(RealTimeDataProvider):
         self.last_r += self.inc
         return x, y
 
+    def skip(self, samples):
+        super(RealTimeFunctionDataProvider, self).skip(samples)
+        self.last_r += self.inc*samples
+
+    def get_available_values(self, samples=None):
+        xs           = self.next_times(self.samples_due() if samples is None else samples)
+        rs           = self.last_r + self.inc*np.arange(len(xs))
+        self.last_r += self.inc*len(xs)
+        if isinstance(self.function, np.ufunc):
+            ys = self.function(rs)
+        else:
+            ys = np.array([self.function(r) for r in rs], dtype=np.float64)
+        return xs, ys
+
 
 class RealTimeConstantDataProvider(RealTimeDataProvider):
     """
     Returns a constant value every time (but can be changed with sef_reference)
     """
-    def __init__(self, dt=0.1, min_y=0.0, max_y=10.0, color='Black'):
+    def __init__(self, dt=0.1, min_y=0.0, max_y=10.0, color='Black', samples_per_frame=None, max_samples=10000):
         self.reference = 0.0
-        super(RealTimeConstantDataProvider, self).__init__(dt=dt, min_y=min_y, max_y=max_y, color=color)
+        super(RealTimeConstantDataProvider, self).__init__(dt=dt, min_y=min_y, max_y=max_y, color=color,
+                                                           samples_per_frame=samples_per_frame,
+                                                           max_samples=max_samples)
 
     def set_reference(self, new_reference):
         self.reference = new_reference
@@ -94,48 +246,643 @@ class RealTimeConstantDataProvider(RealTimeDataProvider):
         self.t += self.dt
         return x, self.reference
 
+    def get_available_values(self, samples=None):
+        xs = self.next_times(self.samples_due() if samples is None else samples)
+        return xs, np.full(len(xs), self.reference, dtype=np.float64)
+
+
+class ThreadedDataProvider(RealTimeDataProvider):
+    """
+    Runs a data provider in its own thread (at its own rate), so a slow one (ex: a sensor read or a simulation step)
+    does not stall the GUI
+    Notes:
+        - each batch of values (xs and ys arrays) is queued as it is until the next frame takes all of them (they are
+          concatenated), the queue is shared with the thread so it is used with a lock
+        - when there are max_values waiting the policy defines what to do: drop the new values, block the producer
+          until there is room or overwrite the oldest values
+        - values lost are reported with report_dropped
+    """
+    shares_time      = False
+    drop_policy      = 'drop'
+    block_policy     = 'block'
+    overwrite_policy = 'overwrite'
+
+    def __init__(self, provider, period=0.01, max_values=10000, policy='drop', communicate=None):
+        """
+        :param provider:    data provider to run in the thread (its get_available_values() is called every period)
+        :param period:      time between calls to the provider (in seconds)
+        :param max_values:  max number of values waiting for the next frame
+        :param policy:      what to do when max_values is reached: 'drop', 'block' or 'overwrite'
+        :param communicate: QTAux.Communicate, if None the one of the figure is used
+        """
+        if policy not in [self.drop_policy, self.block_policy, self.overwrite_policy]:
+            raise Exception('%s policy not implemented (valid ones are %s, %s and %s)' %
+                            (policy, self.drop_policy, self.block_policy, self.overwrite_policy))
+        super(ThreadedDataProvider, self).__init__(dt=provider.dt, min_y=provider.min_y, max_y=provider.max_y,
+                                                   color=provider.color)
+        self.provider    = provider
+        self.period      = period
+        self.max_values  = max_values
+        self.policy      = policy
+        self.communicate = communicate
+        self.batches     = deque()  # [xs, ys] waiting for the next frame
+        self.waiting     = 0        # number of values in batches
+        self.lock        = threading.Lock()
+        self.stopping    = threading.Event()
+        self.thread      = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stopping.clear()
+        self.provider.start()
+        self.thread = threading.Thread(target=self.produce, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+        self.provider.stop()
+
+    def produce(self):
+        while not self.stopping.is_set():
+            started = time.perf_counter()
+            xs, ys  = self.provider.get_available_values()
+            self.store(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))
+            self.stopping.wait(max(0.0, self.period - (time.perf_counter() - started)))
+
+    def store(self, xs, ys):
+        if self.policy == self.block_policy:
+            while len(xs) > 0 and not self.stopping.is_set():
+                with self.lock:
+                    room = self.max_values - self.waiting
+                    if room > 0:
+                        self.add_batch(xs[:room], ys[:room])
+                        xs, ys = xs[room:], ys[room:]
+                if room <= 0:
+                    self.stopping.wait(self.period)
+            return
+
+        with self.lock:
+            if self.policy == self.drop_policy:
+                room    = max(0, self.max_values - self.waiting)
+                dropped = max(0, len(xs) - room)
+                self.add_batch(xs[:room], ys[:room])
+            else:
+                self.add_batch(xs, ys)
+                dropped = max(0, self.waiting - self.max_values)
+                self.remove_oldest(dropped)
+        if dropped > 0:
+            self.report_dropped(dropped)
+
+    def add_batch(self, xs, ys):
+        if len(xs) > 0:
+            self.batches.append([xs, ys])
+            self.waiting += len(xs)
+
+    def remove_oldest(self, count):
+        while count > 0:
+            xs, ys = self.batches[0]
+            if len(xs) <= count:
+                self.batches.popleft()
+                removed = len(xs)
+            else:
+                self.batches[0] = [xs[count:], ys[count:]]
+                removed = count
+            self.waiting -= removed
+            count        -= removed
+
+    def get_next_values(self, i):
+        with self.lock:
+            if not self.batches:
+                return self.t, 0.0
+            xs, ys = self.batches[0]
+            self.remove_oldest(1)
+        return xs[0], ys[0]
+
+    def get_available_values(self):
+        if self.thread is None:
+            self.start()
+        with self.lock:
+            batches = list(self.batches)
+            self.batches.clear()
+            self.waiting = 0
+        if not batches:
+            return np.zeros(0), np.zeros(0)
+        return np.concatenate([xs for xs, _ in batches]), np.concatenate([ys for _, ys in batches])
+
+
+class ReplayDataProvider(RealTimeDataProvider):
+    """
+    Replays a channel recorded by SignalRecorder (see the record key of an animation in FigureView)
+    Notes:
+        - the file is mapped in memory, only the values of each frame are read from disk (and released after)
+        - the times are searched with bisect, np.searchsorted would copy the whole (strided) time column
+        - speed is the number of recorded seconds shown per second, None shows samples_per_frame samples every frame
+          (as fast as the animation can)
+    """
+    shares_time = False
+
+    def __init__(self, file_name, channel=0, speed=1.0, min_y=0.0, max_y=10.0, color='Red', samples_per_frame=1000):
+        """
+        :param file_name: file written by SignalRecorder
+        :param channel:   channel to replay (the position of the line in its group of lines that share the time)
+        :param speed:     1.0 replays in real time, 2.0 twice as fast, None as fast as possible
+        :param min_y:
+        :param max_y:
+        :param color:
+        :param samples_per_frame: samples per frame when speed is None
+        """
+        super(ReplayDataProvider, self).__init__(min_y=min_y, max_y=max_y, color=color,
+                                                 samples_per_frame=samples_per_frame)
+        self.data = rc.read_signal_file(file_name)
+        if channel + 1 >= self.data.shape[1]:
+            raise Exception('Channel %s not present in %s (it has %s channels)' %
+                            (channel, file_name, self.data.shape[1] - 1))
+        self.times    = self.data[:, 0]
+        self.channel  = channel
+        self.speed    = speed
+        self.position = 0      # next row to return
+        self.start_t  = None   # replay time and clock time when the replay (re)started
+        self.start_clock = None
+        if len(self.times) > 0:
+            self.t = self.times[0]
+
+    def start(self):
+        self.start_clock = None  # the time stopped is not replayed, the clock starts again in the next frame
+
+    def stop(self):
+        self.start_clock = None
+
+    def seek(self, t):
+        """
+        Continue the replay from time t
+        :param t:
+        :return:
+        """
+        self.position    = bisect.bisect_left(self.times, t)
+        self.t           = t
+        self.start_t     = t
+        self.start_clock = None
+
+    def get_next_values(self, i):
+        xs, ys = self.get_available_values()
+        return (xs[-1], ys[-1]) if len(xs) > 0 else (self.t, 0.0)
+
+    def get_available_values(self):
+        if self.speed is None:
+            end = min(self.position + self.samples_per_frame, len(self.times))
+        else:
+            now = self.clock()
+            if self.start_clock is None:
+                self.start_clock = now
+                self.start_t     = self.t
+            self.t = self.start_t + (now - self.start_clock)*self.speed
+            end    = bisect.bisect_right(self.times, self.t)
+
+        rows          = self.data[self.position:end]
+        self.position = max(end, self.position)
+        if len(rows) > 0 and self.speed is None:
+            self.t = rows[-1, 0]
+        xs, ys = np.array(rows[:, 0]), np.array(rows[:, self.channel + 1])
+        rc.release_signal_file(self.data)
+        return xs, ys
+
+    def is_finished(self):
+        return self.position >= len(self.times)
+
+
+class StatisticsBands(object):
+    """
+    Shaded bands behind an animated line: mean +- k*std and the min/max envelope of the last values (window)
+    Notes:
+        - the statistics are incremental, no window is scanned again: mean and std come from the running sums of the
+          values and their squares (cumsum over the last window - 1 values and the new ones), min and max are the
+          first item of monotonic queues (see sliding_extremes)
+        - the statistics of the values shown are kept in a MultiSignalHistory, and each band is a single Polygon
+          whose vertices are replaced every frame (decimated as the line, see update_artists)
+    """
+
+    def __init__(self, ax, length, window=20, k=2.0, envelope=True, color='Red', alpha=0.2, animated=False):
+        """
+        :param ax:
+        :param length:   number of values shown (the same as the line)
+        :param window:   number of values used in the statistics of each one
+        :param k:        number of standard deviations of the band
+        :param envelope: whether to show the min/max envelope
+        :param color:
+        :param alpha:    transparency of the band (the envelope is lighter)
+        :param animated: True when blitting
+        """
+        self.window  = window
+        self.last_ys = np.zeros(0)  # last window - 1 values received
+        self.count   = 0            # number of values received
+        self.mins    = deque()      # [index, value] of the candidates to min of the window (increasing values)
+        self.maxs    = deque()      # [index, value] of the candidates to max of the window (decreasing values)
+        self.k       = k
+        self.values  = sg.MultiSignalHistory(length, channels=4)  # mean, std, min and max of each value
+        self.band    = add_band(ax, color, alpha, animated)
+        self.envelope = add_band(ax, color, alpha/2, animated) if envelope else None
+        self.artists = [artist for artist in [self.envelope, self.band] if artist is not None]
+
+    def append(self, xs, ys):
+        """
+        :param xs: array of times
+        :param ys: array of values
+        :return:
+        """
+        if len(xs) == 0:
+            return
+        ys     = np.asarray(ys, dtype=np.float64)
+        values = np.concatenate([self.last_ys, ys])
+        # running sums of the values and their squares (shifted by the first value, so the squares keep the precision)
+        shifted  = values - values[0]
+        sums     = np.concatenate([[0.0], np.cumsum(shifted)])
+        squares  = np.concatenate([[0.0], np.cumsum(shifted*shifted)])
+        ends     = np.arange(len(self.last_ys), len(values)) + 1  # window of each new value: [starts, ends)
+        starts   = np.maximum(ends - self.window, 0)
+        counts   = ends - starts
+        mean     = (sums[ends] - sums[starts])/counts
+        variance = (squares[ends] - squares[starts])/counts - mean*mean
+
+        statistics    = np.empty((4, len(xs)), dtype=np.float64)
+        statistics[0] = mean + values[0]
+        statistics[1] = np.sqrt(np.maximum(variance, 0.0))
+        if self.envelope is not None:
+            statistics[2] = sliding_extremes(self.mins, ys, self.count, self.window, operator.ge)
+            statistics[3] = sliding_extremes(self.maxs, ys, self.count, self.window, operator.le)
+        else:
+            statistics[2:] = np.nan
+        self.last_ys = values[-(self.window - 1):] if self.window > 1 else np.zeros(0)
+        self.count  += len(ys)
+        self.values.append_rows(xs, statistics)
+
+    def update_artists(self, max_points=None, method='minmax'):
+        """
+        :param max_points: max points of each side of the bands (None means all), the same ones as the line
+        :param method:     decimation method (see decimate)
+        :return:
+        """
+        if self.values.get_count() == 0:
+            return
+        xs   = self.values.get_time()
+        mean = self.values.get_channel(0)
+        std  = self.values.get_channel(1)
+        self.band.set_xy(band_vertices(xs, mean - self.k*std, mean + self.k*std, max_points, method))
+        if self.envelope is not None:
+            self.envelope.set_xy(band_vertices(xs, self.values.get_channel(2), self.values.get_channel(3), max_points,
+                                               method))
+
+
+def sliding_extremes(queue, ys, index, window, is_worse):
+    """
+    Returns the min (or max) of the last window values at each new value, with a monotonic queue: a value is dropped
+    when a newer one is better (it cannot be the extreme anymore) or it leaves the window, so each value is added and
+    removed just once
+    :param queue:    deque of [index, value] kept between calls (the values are in order, the first is the extreme)
+    :param ys:       array of new values
+    :param index:    index of the first new value
+    :param window:
+    :param is_worse: operator.ge for the min, operator.le for the max
+    :return: array with the extreme of each new value
+    """
+    extremes = np.empty(len(ys), dtype=np.float64)
+    for i, y in enumerate(ys.tolist()):
+        while queue and is_worse(queue[-1][1], y):
+            queue.pop()
+        queue.append([index + i, y])
+        if queue[0][0] <= index + i - window:
+            queue.popleft()
+        extremes[i] = queue[0][1]
+    return extremes
+
+
+def add_band(ax, color, alpha, animated):
+    band = mpatches.Polygon(np.zeros((1, 2)), closed=True, facecolor=color, alpha=alpha, linewidth=0,
+                            animated=animated)
+    ax.add_patch(band)
+    return band
+
+
+def band_vertices(xs, lower, upper, max_points=None, method='minmax'):
+    """
+    Returns the vertices of the polygon between lower and upper (as fill_between does)
+    :param max_points: if given, each side is decimated to about max_points (see decimate)
+    """
+    lower_xs, upper_xs = xs, xs
+    if max_points is not None:
+        upper_xs, upper = decimate(xs, upper, max_points, method=method)
+        lower_xs, lower = decimate(xs, lower, max_points, method=method)
+    return np.concatenate([np.column_stack([upper_xs, upper]), np.column_stack([lower_xs[::-1], lower[::-1]])])
+
 
 def graph_points_for_many_functions(function_name, number_of_points):
-    msg = ''
-    if function_name == 'Random':
-        points = random_function(0, number_of_points)
-    elif function_name == 'Sine':
-        points = get_function_xy_values(math.sin, 0, number_of_points, inc=math.radians(10))
-    elif function_name == 'Cosine':
-        points = get_function_xy_values(math.cos, 0, number_of_points, inc=math.radians(10))
-    else:
-        points = None
-        msg    = '%s not implemented' % function_name
-    return points, msg
+    """
+    Returns the points of one of the registered functions (see register_function)
+    Note: the points are a new list each time, graph_arrays_for_many_functions returns the (shared) arrays
+    :param function_name:
+    :param number_of_points:
+    :return: points (list of [x, y], None if the function is not registered), msg
+    """
+    xs, ys = graph_arrays_for_many_functions(function_name, number_of_points)
+    if xs is None:
+        return None, ys
+    return to_points(xs, ys).tolist(), ''
+
+
+def graph_arrays_for_many_functions(function_name, number_of_points):
+    """
+    Returns the values of one of the registered functions, without copying them (see get_function_arrays)
+    :param function_name:
+    :param number_of_points:
+    :return: xs, ys arrays (read only) or None, msg if the function is not registered
+    """
+    if function_name not in function_generators:
+        return None, '%s not implemented' % function_name
+    return get_function_arrays(function_name, number_of_points)
 
 
-def graph_points(ax, points, scale_type='scaled', x_visible=True, y_visible=True, line_width=1.0, color='Blue'):
+def xy_bounds(xs, ys):
+    """
+    Returns the corners of the box that contains the values (ex: for FigureView.resize_axis)
+    :param xs:
+    :param ys:
+    :return: list of [x, y] (empty if there are no values)
+    """
+    if len(xs) == 0:
+        return []
+    return [[xs.min(), ys.min()], [xs.max(), ys.max()]]
+
+
+def graph_points(ax, points, scale_type='scaled', x_visible=True, y_visible=True, line_width=1.0, color='Blue',
+                 artist=None):
+    """
+    Graph the points as a polyline
+    :param ax:
+    :param points: list of [x, y] or array of shape (n, 2)
+    :param scale_type:
+    :param x_visible:
+    :param y_visible:
+    :param line_width:
+    :param color: a color, or a list with a color per segment (n - 1)
+    :param artist: a Line2D or LineCollection to reuse (ex: FigureView.line), if None a new one is added
+    :return: the artist used (None if there are no points and no artist was given)
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if len(points) == 0 and artist is None:
+        ax.axis(scale_type)
+        ax.get_xaxis().set_visible(x_visible)
+        ax.get_yaxis().set_visible(y_visible)
+        return None
+    return graph_xy(ax, points[:, 0], points[:, 1], scale_type=scale_type, x_visible=x_visible,
+                    y_visible=y_visible, line_width=line_width, color=color, artist=artist)
+
+
+def graph_xy(ax, xs, ys, scale_type='scaled', x_visible=True, y_visible=True, line_width=1.0, color='Blue',
+             artist=None):
+    """
+    Graph a polyline with just one artist: a Line2D or, if each segment has its own color, a LineCollection
+    :param ax:
+    :param xs: array of x values
+    :param ys: array of y values
+    :param scale_type:
+    :param x_visible:
+    :param y_visible:
+    :param line_width:
+    :param color: a color, or a list with a color per segment (len(xs) - 1)
+    :param artist: a Line2D or LineCollection to reuse (ex: FigureView.line), if None a new one is added
+    :return: the artist used
+    """
     ax.axis(scale_type)
     ax.get_xaxis().set_visible(x_visible)
     ax.get_yaxis().set_visible(y_visible)
-    number_of_points = len(points)
-    if number_of_points == 0:
-        pass
+    single_color = mcolors.is_color_like(color)
+    if isinstance(artist, mlines.Line2D) or (artist is None and (single_color or len(xs) < 2)):
+        if artist is None:
+            artist = mlines.Line2D(xs, ys)
+            ax.add_line(artist)
+        else:
+            artist.set_data(xs, ys)
+        artist.set_color(color if single_color else color[0])
+        artist.set_linewidth(line_width)
+        return artist
+    points   = np.column_stack([xs, ys])
+    segments = np.stack([points[:-1], points[1:]], axis=1)
+    if artist is None:
+        artist = mcollections.LineCollection(segments)
+        ax.add_collection(artist, autolim=True)
     else:
-        first_point = points[0]
-        for i in range(1, number_of_points):
-            [x2, y2] = points[i]
-            line     = mlines.Line2D([first_point[0], x2], [first_point[1], y2], color=color, linewidth=line_width)
-            ax.add_line(line)
-            first_point = [x2, y2]
+        artist.set_segments(segments)
+    artist.set_color(color)
+    artist.set_linewidth(line_width)
+    return artist
 
 
 def random_function(from_x, to_x, min_y=0, max_y=10):
-    # x = np.linspace(from_x, to_x)
-    # y = np.random.randint(min_y, max_y, len(x))
-    # return x, y
-    return [[x, random.randint(min_y, max_y)] for x in range(from_x, to_x)]
+    xs = np.arange(from_x, to_x)
+    ys = np.random.randint(min_y, max_y + 1, len(xs))
+    return to_points(xs, ys).tolist()
 
 
 def get_function_xy_values(function, from_x, to_x, inc=math.radians(5)):
-    points = []
-    x      = 0.0
-    for i in range(from_x, to_x):
-        points.append([x, function(x)])
-        x += inc
-    return points
+    return to_points(*function_xy_arrays(function, to_x - from_x, inc)).tolist()
+
+
+def to_points(xs, ys):
+    """
+    Returns the points as an array of [x, y] (compatible with the lists of points)
+    Note: the values are copied, graph_xy uses the arrays as they are
+    :param xs:
+    :param ys:
+    :return: array of shape (n, 2)
+    """
+    return np.column_stack([xs, ys])
+
+
+def function_xy_arrays(function, number_of_points, inc=math.radians(5)):
+    """
+    Returns the values of a function from x = 0 (every inc)
+    :param function: numpy ufunc (ex: np.sin) or any function of one float
+    :param number_of_points:
+    :param inc:
+    :return: xs, ys arrays
+    """
+    xs = inc*np.arange(number_of_points, dtype=np.float64)
+    if isinstance(function, np.ufunc):
+        ys = function(xs)
+    else:
+        ys = np.fromiter((function(x) for x in xs), dtype=np.float64, count=number_of_points)
+    return xs, ys
+
+
+def random_xy_arrays(number_of_points, inc=1.0, min_y=0, max_y=10):
+    """
+    Returns random integer values (between min_y and max_y, both included)
+    :return: xs, ys arrays
+    """
+    xs = inc*np.arange(number_of_points, dtype=np.float64)
+    ys = np.random.randint(min_y, max_y + 1, number_of_points).astype(np.float64)
+    return xs, ys
+
+
+# Functions that can be graphed, by name: [generator, inc, cacheable] (see register_function)
+function_generators = {}
+# Last series generated, by (name, number of points, inc)
+generated_arrays     = OrderedDict()
+max_generated_arrays = 16
+
+
+def register_function(name, generator, inc=math.radians(10), cacheable=True):
+    """
+    Add a function that can be graphed by name (ex: listed in a Combo)
+    :param name:
+    :param generator: called with (number_of_points, inc), returns xs, ys arrays
+                      (for a plain function use function_generator)
+    :param inc:       default distance between x values
+    :param cacheable: whether the same arguments return the same values (random ones do not), so they can be reused
+    :return:
+    """
+    function_generators[name] = [generator, inc, cacheable]
+    for key in [key for key in generated_arrays if key[0] == name]:
+        del generated_arrays[key]
+
+
+def function_generator(function):
+    """
+    Returns a generator of the values of function (see register_function)
+    :param function: numpy ufunc (ex: np.sin) or any function of one float
+    :return:
+    """
+    def generator(number_of_points, inc):
+        return function_xy_arrays(function, number_of_points, inc)
+    return generator
+
+
+def get_function_names():
+    return list(function_generators)
+
+
+def get_function_arrays(name, number_of_points, inc=None):
+    """
+    Returns the values of a registered function, the last ones generated are reused
+    Note: the arrays returned are read only, because they can be shared
+    :param name:
+    :param number_of_points:
+    :param inc: distance between x values (None for the one the function was registered with)
+    :return: xs, ys arrays
+    """
+    if name not in function_generators:
+        raise Exception('Function %s not registered (valid ones are %s)' % (name, get_function_names()))
+    generator, default_inc, cacheable = function_generators[name]
+    inc = default_inc if inc is None else inc
+    key = (name, number_of_points, inc)
+    if key in generated_arrays:
+        generated_arrays.move_to_end(key)
+        return generated_arrays[key]
+
+    xs, ys = generator(number_of_points, inc)
+    xs.setflags(write=False)
+    ys.setflags(write=False)
+    if cacheable:
+        generated_arrays[key] = xs, ys
+        if len(generated_arrays) > max_generated_arrays:
+            generated_arrays.popitem(last=False)
+    return xs, ys
+
+
+register_function('Sine', function_generator(np.sin))
+register_function('Cosine', function_generator(np.cos))
+register_function('Random', random_xy_arrays, inc=1.0, cacheable=False)
+
+
+lttb_candidates = 4  # points preselected (with minmax) per point returned by lttb decimation
+
+
+def decimate(xs, ys, max_points, method='minmax'):
+    """
+    Reduce a line to about max_points, keeping its shape (spikes included)
+    :param xs:
+    :param ys:
+    :param max_points:
+    :param method: 'minmax' (fast, min and max of each bucket) or 'lttb' (largest triangle three buckets, the
+                   candidates are preselected with minmax so it is fast enough to use in every frame, see
+                   lttb_decimation for the exact one)
+    :return: xs, ys (the same ones if they already have less than max_points)
+    """
+    if len(xs) <= max_points or max_points < 3:
+        return xs, ys
+    if method == 'minmax':
+        return minmax_decimation(xs, ys, max_points // 2)
+    elif method == 'lttb':
+        if len(xs) > lttb_candidates*max_points:
+            # MinMaxLTTB: the point chosen in each bucket is almost always a min or a max of a part of it
+            candidates = minmax_decimation(xs[1:-1], ys[1:-1], lttb_candidates*max_points // 2)
+            xs = np.concatenate([xs[:1], candidates[0], xs[-1:]])
+            ys = np.concatenate([ys[:1], candidates[1], ys[-1:]])
+        return lttb_decimation(xs, ys, max_points)
+    else:
+        raise Exception('%s decimation not implemented (valid ones are minmax and lttb)' % method)
+
+
+def minmax_decimation(xs, ys, buckets):
+    """
+    Split the points in buckets (of the same number of points) and keep the min and max of each one
+    :param xs:
+    :param ys:
+    :param buckets:
+    :return: xs, ys with 2 points per bucket (in the original order)
+    """
+    count  = len(ys)
+    size   = int(math.ceil(count / buckets))
+    rows   = int(math.ceil(count / size))
+    padded = np.empty(rows*size, dtype=np.float64)
+    padded[:count] = ys
+    padded[count:] = ys[-1]  # fill the last bucket with a value that doesn't change its min and max
+    padded = padded.reshape(rows, size)
+
+    starts  = np.arange(rows)*size
+    indexes = np.sort(np.stack([starts + padded.argmin(axis=1), starts + padded.argmax(axis=1)], axis=1), axis=1)
+    indexes = np.minimum(indexes.ravel(), count - 1)
+    return xs[indexes], ys[indexes]
+
+
+def lttb_decimation(xs, ys, points):
+    """
+    Largest Triangle Three Buckets: keeps the first and last point, and for each bucket in between the point that
+    forms the largest triangle with the point chosen in the previous bucket and the average of the next one
+    Note: each bucket depends on the point chosen in the previous one, so the points are visited in a loop (the
+          averages are computed at once), it takes about 20 ms for 100k points, use decimate in each frame
+    :param xs:
+    :param ys:
+    :param points: number of points to return
+    :return: xs, ys
+    """
+    count     = len(xs)
+    edges     = np.linspace(1, count - 1, points - 1).astype(int)
+    next_ends = np.append(edges[2:], count)
+    sums_x    = np.concatenate([[0.0], np.cumsum(xs)])
+    sums_y    = np.concatenate([[0.0], np.cumsum(ys)])
+    sizes     = next_ends - edges[1:]
+    avgs_x    = ((sums_x[next_ends] - sums_x[edges[1:]])/sizes).tolist()
+    avgs_y    = ((sums_y[next_ends] - sums_y[edges[1:]])/sizes).tolist()
+
+    # python floats are faster than numpy calls for buckets of a few points
+    values_x, values_y, edges = xs.tolist(), ys.tolist(), edges.tolist()
+    indexes  = [0]
+    chosen_x = values_x[0]
+    chosen_y = values_y[0]
+    for i in range(points - 2):
+        delta_x = chosen_x - avgs_x[i]
+        delta_y = avgs_y[i] - chosen_y
+        max_area, chosen = -1.0, edges[i]
+        for j in range(edges[i], edges[i + 1]):
+            area = abs(delta_x*(values_y[j] - chosen_y) - (chosen_x - values_x[j])*delta_y)
+            if area > max_area:
+                max_area, chosen = area, j
+        indexes.append(chosen)
+        chosen_x, chosen_y = values_x[chosen], values_y[chosen]
+    indexes.append(count - 1)
+    return xs[indexes], ys[indexes]
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+import argparse
+import importlib
+import os
+import time
+
+import numpy as np
+import matplotlib.image as mpimg
+
+# must be set before the QApplication is created, so it works without a display (ex: in a CI box)
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5 import QtWidgets
+
+import WinDeklar.QTAux as QTAux
+import WinDeklar.WindowForm as WinForm
+import WinDeklar.graph_aux as ga
+import WinDeklar.yaml_functions as yaml
+
+
+class HeadlessRenderer(object):
+    """
+    Renders the figures of a WinForm frame by frame, as fast as possible and without the event loop, useful for
+    regression comparisons and reports
+    Notes:
+        - the window is created offscreen, its timers are stopped and the frames are stepped by render()
+        - animated figures are advanced with update_frame, the others updated with update_figure (waiting for the
+          result of the ones with async_update)
+        - the frames are not paced by a timer, the data providers get a SimulatedClock that advances the interval of
+          the figure in each frame, so they produce the same values per frame as in real time (the ones that run in
+          their own thread, like ThreadedDataProvider, still use the real clock and give less values per frame)
+    """
+    png_format = 'png'
+    npy_format = 'npy'
+
+    def __init__(self, form_file_path, provider, figure_names=None, ext='yaml'):
+        """
+        :param form_file_path: file of the program that handles the form logic (the definition has the same name)
+        :param provider:       subclass of HostModel
+        :param figure_names:   figures to render (None means all)
+        :param ext:            extension of the WinForm definition
+        """
+        self.app    = QtWidgets.QApplication.instance() or QTAux.def_app()
+        config_name = yaml.get_file_name_with_other_extension(form_file_path, ext)
+        self.window = WinForm.ConfigurableWindow(WinForm.get_win_config(config_name), provider)
+        self.figures = [figure for figure in self.window.fig_views if isinstance(figure, WinForm.FigureView) and
+                        (figure_names is None or figure.name in figure_names)]
+        if len(self.figures) == 0:
+            raise Exception('No figures to render in %s (figures asked: %s)' % (config_name, figure_names))
+
+        # the frames are stepped by render()
+        if self.window.animation_clock is not None:
+            self.window.animation_clock.stop()
+        [figure.anim.stop() for figure in self.window.fig_views
+         if isinstance(figure, WinForm.FigureView) and figure.anim is not None]
+        self.clocks = {}
+        for figure in self.figures:
+            if figure.anim is not None:
+                self.clocks[figure.name] = ga.SimulatedClock()
+                for dp in figure.data_provider:
+                    dp.clock = self.clocks[figure.name]
+        self.app.processEvents()  # so the figures get the size of the layout
+
+    def render(self, frames=100, output_dir=None, output_format='png', on_frame=None):
+        """
+        Renders the frames
+        :param frames:        number of frames
+        :param output_dir:    where to write the frames (None means do not write them, ex: to measure the speed)
+        :param output_format: 'png' (a file per figure and frame: <figure>_<frame>.png) or 'npy' (a file per
+                              figure with all the frames as RGBA: <figure>.npy of shape (frames, height, width, 4))
+        :param on_frame:      called with the frame number before rendering it (ex: to change the state)
+        :return: report dict (frames, seconds, fps)
+        """
+        if output_format not in [self.png_format, self.npy_format]:
+            raise Exception('%s format not implemented (valid ones are %s and %s)' %
+                            (output_format, self.png_format, self.npy_format))
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+        arrays  = {}
+        started = time.perf_counter()
+        for frame_number in range(frames):
+            if on_frame is not None:
+                on_frame(frame_number)
+            for figure in self.figures:
+                if figure.name in self.clocks:
+                    self.clocks[figure.name].advance(figure.anim.interval/1000.0)
+                rgba = self.render_frame(figure, frame_number)
+                if output_dir is None:
+                    continue
+                if output_format == self.png_format:
+                    mpimg.imsave(os.path.join(output_dir, '%s_%05d.png' % (figure.name, frame_number)), rgba)
+                else:
+                    if figure.name not in arrays:
+                        arrays[figure.name] = np.lib.format.open_memmap(
+                            os.path.join(output_dir, '%s.npy' % figure.name), mode='w+', dtype=np.uint8,
+                            shape=(frames,) + rgba.shape)
+                    arrays[figure.name][frame_number] = rgba
+        seconds = time.perf_counter() - started
+        [array.flush() for array in arrays.values()]
+
+        return {'frames': frames, 'figures': len(self.figures), 'seconds': seconds,
+                'fps': frames/seconds if seconds > 0 else 0.0}
+
+    @staticmethod
+    def render_frame(figure, frame_number):
+        """
+        Advances a figure one frame and draws it
+        :param figure:
+        :param frame_number:
+        :return: the image (array of height x width x 4)
+        """
+        if figure.anim is not None:
+            figure.update_frame(frame_number)
+            figure.render_frame(repaint=False)  # blitting in strip charts, the image is in the Agg buffer anyway
+        else:
+            figure.invalidate()
+            figure.last_update = None  # min_interval does not apply, every frame is rendered
+            figure.update_figure()
+            if figure.async_update:
+                figure.wait_view()  # there is no event loop to receive the result
+        return np.asarray(figure.buffer_rgba())
+
+    def close(self):
+        self.window.stop_animations()
+        self.window.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Renders the figures of a WinForm without a display')
+    parser.add_argument('module', help='module of the form program (ex: WinDeklar.view_animation)')
+    parser.add_argument('host', nargs='?', default='ExampleHost', help='HostModel subclass in the module')
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--output', default=None, help='directory to write the frames')
+    parser.add_argument('--format', default=HeadlessRenderer.png_format, help='png or npy')
+    parser.add_argument('--figures', nargs='*', default=None, help='names of the figures to render')
+    args = parser.parse_args()
+
+    module   = importlib.import_module(args.module)
+    renderer = HeadlessRenderer(module.__file__, getattr(module, args.host)(), figure_names=args.figures)
+    report   = renderer.render(frames=args.frames, output_dir=args.output, output_format=args.format)
+    renderer.close()
+    print('%s frames of %s figures in %.2f seconds (%.1f frames/s)' %
+          (report['frames'], report['figures'], report['seconds'], report['fps']))
+
+
+if __name__ == '__main__':
+    main()
@@ -22,9 +22,15 @@ class PointsBox:
     def add_points(self, points):
         """
         Use the points to update the box size
-        :param points: :type list of [x, y]
+        :param points: :type list of [x, y] or numpy array of shape (n, 2)
         :return: nothing
         """
+        if hasattr(points, 'shape'):
+            # numpy array: only the corners matter
+            if len(points) > 0:
+                self.add_point(points.min(axis=0))
+                self.add_point(points.max(axis=0))
+            return
         for p in points:
             self.add_point(p)
 
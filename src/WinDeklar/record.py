@@ -2,10 +2,19 @@
 
 from __future__ import print_function
 
+import mmap
+import os
 from datetime import datetime
 
+import numpy as np
+
 import WinDeklar.yaml_functions as yaml
 
+# Signal files (see SignalRecorder): a header (signal_magic and the number of columns as int64) followed by rows of
+# float64 values (time and one value per channel)
+signal_magic       = b'WDSIGNAL'
+signal_header_size = len(signal_magic) + np.dtype(np.int64).itemsize
+
 
 class Record:
     def __init__(self, file_name, dir='/tmp', indent=2, ext='yaml', add_time_stamp=True):
@@ -80,6 +89,79 @@ class Record:
             self.file_name_ts = None
 
 
+class SignalRecorder(Record):
+    """
+    Records the values of an animation (time and channels) in a binary file, so they can be replayed later
+    (see graph_aux.ReplayDataProvider)
+    Note: the rows are just appended, the number of rows is given by the file size, so the file is valid even if the
+          program ends abruptly
+    """
+
+    def __init__(self, file_name, channels=1, dir='/tmp', add_time_stamp=True, ext='sig'):
+        """
+        :param file_name:
+        :param channels:       number of values (besides the time) in each row
+        :param dir:
+        :param add_time_stamp:
+        :param ext:
+        """
+        super(SignalRecorder, self).__init__(file_name, dir=dir, ext=ext, add_time_stamp=add_time_stamp)
+        self.columns = channels + 1
+        self.rows    = 0
+
+    def append_rows(self, xs, ys):
+        """
+        :param xs: array of times
+        :param ys: matrix with a row per channel and a column per sample
+        :return:
+        """
+        if len(xs) == 0:
+            return
+        if not self.opened:
+            self.file   = open(self.get_full_file_name(), 'wb')
+            self.opened = True
+            self.file.write(signal_magic)
+            self.file.write(np.int64(self.columns).tobytes())
+        rows = np.empty((len(xs), self.columns), dtype=np.float64)
+        rows[:, 0]  = xs
+        rows[:, 1:] = np.asarray(ys).T
+        self.file.write(rows.tobytes())
+        self.rows += len(xs)
+
+    def flush(self):
+        if self.opened:
+            self.file.flush()
+
+
+def read_signal_file(file_name):
+    """
+    Maps a file written by SignalRecorder, the values are read from disk only when used
+    :param file_name:
+    :return: read only matrix with a row per sample (time and channels)
+    """
+    with open(file_name, 'rb') as file:
+        header = file.read(signal_header_size)
+    if len(header) < signal_header_size or header[:len(signal_magic)] != signal_magic:
+        raise Exception('%s is not a signal file' % file_name)
+    columns = int(np.frombuffer(header, dtype=np.int64, offset=len(signal_magic))[0])
+    rows    = (os.path.getsize(file_name) - signal_header_size) // (columns*np.dtype(np.float64).itemsize)
+    if rows == 0:
+        return np.zeros((0, columns))
+    return np.memmap(file_name, dtype=np.float64, mode='r', offset=signal_header_size, shape=(rows, columns))
+
+
+def release_signal_file(data):
+    """
+    Tells the OS that the pages of a mapped signal file read so far are not needed (they are read again from disk if
+    used), otherwise the memory used grows up to the file size while moving through it
+    :param data: matrix returned by read_signal_file
+    :return:
+    """
+    memory = getattr(data, '_mmap', None)
+    if memory is not None and hasattr(memory, 'madvise') and hasattr(mmap, 'MADV_DONTNEED'):
+        memory.madvise(mmap.MADV_DONTNEED)
+
+
 def level_spaces(level, indent_spaces):
     spaces = ''
     for _ in range(1, level+1):
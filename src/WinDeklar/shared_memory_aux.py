@@ -0,0 +1,184 @@
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+import WinDeklar.graph_aux as ga
+
+# Layout of the shared memory:
+#   header: sequence (number of rows written since the creation), capacity (rows), columns (time + channels) and
+#           writing (number of rows written once the current write ends, it is the sequence when not writing)
+#   data:   capacity rows of columns float64 values, used as a ring buffer (row i is in position i % capacity)
+# The writer sets writing before changing the rows and sequence after (a seqlock), so a reader knows which rows could
+# be overwritten while it was copying them
+header_values = 4
+header_size   = header_values*np.dtype(np.int64).itemsize
+# Names of the shared memories opened by the writers of this process, they are registered in the resource tracker
+# (see attach_shared_memory)
+writer_names  = set()
+
+
+class SharedSignalWriter(object):
+    """
+    Writer side of a shared memory channel, used by an external process (ex: a control stack) to feed a
+    SharedMemoryDataProvider without pickling or sockets
+    Note: there must be only one writer per channel
+    """
+
+    def __init__(self, name, capacity=10000, channels=1):
+        """
+        :param name:     name of the shared memory (the readers use the same name)
+        :param capacity: number of rows kept, the oldest ones are overwritten
+        :param channels: number of values (besides the time) in each row
+        """
+        self.capacity = capacity
+        self.columns  = channels + 1
+        size = header_size + capacity*self.columns*np.dtype(np.float64).itemsize
+        try:
+            self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # left by a previous run that crashed, reuse it if it is big enough
+            self.memory = shared_memory.SharedMemory(name=name)
+            if self.memory.size < size:
+                raise Exception('Shared memory %s already exists with a smaller size (%s < %s)' %
+                                (name, self.memory.size, size))
+        writer_names.add(self.memory.name)
+        self.header = np.ndarray((header_values,), dtype=np.int64, buffer=self.memory.buf)
+        self.data   = np.ndarray((capacity, self.columns), dtype=np.float64, buffer=self.memory.buf,
+                                 offset=header_size)
+        self.header[:] = [0, capacity, self.columns, 0]
+
+    def append(self, x, ys):
+        """
+        Writes a row
+        :param x:  time
+        :param ys: one value per channel
+        :return:
+        """
+        sequence = int(self.header[0])
+        self.header[3] = sequence + 1  # announced before the data is written
+        row      = self.data[sequence % self.capacity]
+        row[0]   = x
+        row[1:]  = ys
+        self.header[0] = sequence + 1  # published after the data is written
+
+    def append_rows(self, xs, ys):
+        """
+        Writes many rows at once
+        :param xs: array of times
+        :param ys: matrix with a row per channel and a column per sample
+        :return:
+        """
+        samples = len(xs)
+        if samples == 0:
+            return
+        sequence  = int(self.header[0])
+        self.header[3] = sequence + samples
+        kept      = min(samples, self.capacity)
+        positions = (sequence + samples - kept + np.arange(kept)) % self.capacity
+        self.data[positions, 0]  = np.asarray(xs)[-kept:]
+        self.data[positions, 1:] = np.asarray(ys)[:, -kept:].T
+        self.header[0] = sequence + samples
+
+    def close(self, unlink=True):
+        """
+        :param unlink: whether to destroy the shared memory (readers will not get more values)
+        :return:
+        """
+        self.header = None
+        self.data   = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+            writer_names.discard(self.memory.name)
+
+
+class SharedMemoryDataProvider(ga.RealTimeDataProvider):
+    """
+    Data provider that reads the values written by a SharedSignalWriter (usually from another process)
+    Notes:
+        - each frame the rows written since the last one are copied out of the shared memory in one numpy operation,
+          then the writing counter is read to discard the rows the writer could have overwritten meanwhile (including
+          the ones of a write not finished yet)
+        - if the writer is faster than the frames and overwrites rows not read yet, they are reported as lost (see
+          report_dropped)
+        - the GUI does not depend on the writer process, if it crashes the graph just stops receiving values
+    """
+    shares_time = False
+
+    def __init__(self, name, channel=0, min_y=0.0, max_y=10.0, color='Red', from_start=False):
+        """
+        :param name:       name of the shared memory (the one used in SharedSignalWriter)
+        :param channel:    channel to show
+        :param min_y:
+        :param max_y:
+        :param color:
+        :param from_start: whether to start with the rows already in the shared memory or only with the new ones
+        """
+        super(SharedMemoryDataProvider, self).__init__(min_y=min_y, max_y=max_y, color=color)
+        self.memory   = attach_shared_memory(name)
+        self.header   = np.ndarray((header_values,), dtype=np.int64, buffer=self.memory.buf)
+        self.capacity = int(self.header[1])
+        columns       = int(self.header[2])
+        if channel + 1 >= columns:
+            raise Exception('Channel %s not present in %s (it has %s channels)' % (channel, name, columns - 1))
+        self.data     = np.ndarray((self.capacity, columns), dtype=np.float64, buffer=self.memory.buf,
+                                   offset=header_size)
+        self.channel  = channel
+        self.last_sequence = 0 if from_start else int(self.header[0])
+
+    def get_next_values(self, i):
+        xs, ys = self.get_available_values()
+        return (xs[-1], ys[-1]) if len(xs) > 0 else (self.t, 0.0)
+
+    def get_available_values(self):
+        sequence = int(self.header[0])
+        first    = max(self.last_sequence, sequence - self.capacity)
+        values   = self.read_rows(first, sequence)
+
+        # rows overwritten (even partially) while being copied are not valid
+        valid_first = min(max(first, int(self.header[3]) - self.capacity), sequence)
+        values      = values[:, valid_first - first:]
+
+        lost = valid_first - self.last_sequence
+        if lost > 0:
+            self.report_dropped(lost)
+        self.last_sequence = sequence
+        if values.shape[1] > 0:
+            self.t = values[0, -1]
+        return values[0], values[1]
+
+    def read_rows(self, first, last):
+        """
+        Returns a copy of the time and channel values of rows [first, last)
+        :return: matrix of 2 rows (time and values)
+        """
+        columns = [0, self.channel + 1]
+        start   = first % self.capacity
+        end     = start + (last - first)
+        if end <= self.capacity:
+            return self.data[start:end, columns].T
+        # the rows wrap around the end of the ring buffer
+        return np.concatenate([self.data[start:, columns], self.data[:end - self.capacity, columns]]).T
+
+    def close(self):
+        self.header = None
+        self.data   = None
+        self.memory.close()
+
+
+def attach_shared_memory(name):
+    """
+    Attach to an existing shared memory without tracking it, so it is not destroyed when this process ends
+    (that is the writer's responsibility)
+    Note: before python 3.13 opening it always registers it in the resource tracker of the process, which keeps one
+          entry per name. If the writer is in this process the entry is its own and must stay (unlink removes it)
+    :param name:
+    :return:
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # python >= 3.13
+    except TypeError:
+        memory = shared_memory.SharedMemory(name=name)
+        if memory.name not in writer_names:
+            resource_tracker.unregister(memory._name, 'shared_memory')
+        return memory
@@ -1,18 +1,34 @@
+import bisect
+import math
 from collections import deque
 
+import numpy as np
+
+import WinDeklar.record as rc
+
 
 class SignalHistory(object):
     """
     Store the last N values of a Signal
     """
 
-    def __init__(self, length=10):
-        self.length = length + 1
+    def __init__(self, length=10, threshold=0.1, track_optimums=False):
+        """
+        :param length:
+        :param threshold:      min change in the derivative to consider a local optimum (or a derivative change)
+        :param track_optimums: whether local optimums and derivative changes are detected in every append (useful
+                               when asked in every cycle) instead of scanning the values when asked
+        """
+        self.length         = length + 1
+        self.threshold      = threshold
+        self.track_optimums = track_optimums
         self.values = None  # just to avoid warnings
         self.reset()
 
     def reset(self):
         self.values = deque(maxlen=self.length)
+        self.reset_aggregates()
+        self.reset_optimums()
 
     def get_len(self):
         return self.length
@@ -28,7 +44,11 @@ class SignalHistory(object):
         self.reset()
 
     def append(self, value):
+        evicted = self.values[0] if self.is_full() else None
         self.values.append(value)
+        self.add_to_aggregates(value, evicted)
+        if self.track_optimums:
+            self.check_optimums()
 
     def update(self, value):
         """
@@ -37,8 +57,11 @@ class SignalHistory(object):
         :return:
         """
         # print 'before:%s v:%s' %(self.values, value)
-        self.values.pop()
+        old_value = self.values.pop()
         self.values.append(value)
+        self.update_aggregates(value, old_value)
+        if self.track_optimums:
+            self.check_optimums(replace_last=True)
         # print 'after:%s' %(self.values)
 
     def load(self, values):
@@ -49,7 +72,7 @@ class SignalHistory(object):
         """
         self.reset()
         for value in values:
-            self.values.append(value)
+            self.append(value)
 
     def is_full(self):
         return len(self.values) >= self.length
@@ -70,6 +93,15 @@ class SignalHistory(object):
         for v in self.values:
             yield v
 
+    def get_array(self, lifo_order=False):
+        """
+        Returns the values as a numpy array
+        :param lifo_order: whether the last value is the first one
+        :return:
+        """
+        values = np.fromiter(self.values, dtype=np.float64, count=len(self.values))
+        return values[::-1] if lifo_order else values
+
     # aggregates
     def get_aggregate(self, aggregate_type):
         """
@@ -87,6 +119,10 @@ class SignalHistory(object):
             return self.max()
         elif aggregate_type == 'sum':
             return self.sum()
+        elif aggregate_type == 'variance':
+            return self.variance()
+        elif aggregate_type == 'std':
+            return self.std()
         else:
             raise Exception('%s aggregate type not implemented' % aggregate_type)
 
@@ -103,49 +139,730 @@ class SignalHistory(object):
             return 0
 
     def min(self):
-        return min(self.values)
+        if not self.min_candidates:
+            return min(self.values)  # empty history, fails the same way min() does
+        return self.min_candidates[0][1]
 
     def max(self):
-        return max(self.values)
+        if not self.max_candidates:
+            return max(self.values)
+        return self.max_candidates[0][1]
 
     def sum(self):
-        # To Do: optimize to have the sum pre-calculated in every update
-        return sum(self.values)
+        return self.total
+
+    def variance(self):
+        """
+        Returns the (population) variance of the values
+        """
+        count_v = len(self.values)
+        return max(self.m2, 0.0)/count_v if count_v > 0 else 0.0
+
+    def std(self):
+        return math.sqrt(self.variance())
 
     def weighted_sum(self, weights, lifo_order=True):
-        function = self.get_items_in_lifo_order if lifo_order else self.get_items_in_fifo_order
-        total = 0.0
-        for i, value in enumerate(function()):
-            total += weights[i]*value
-        return total
+        values = self.get_array(lifo_order)
+        return float(np.dot(np.asarray(weights[:len(values)], dtype=np.float64), values))
+
+    def reset_aggregates(self):
+        """
+        Aggregates are maintained in every append/update, so get_aggregate is O(1):
+            - sum is a running sum, recalculated from scratch every N appends to avoid accumulating rounding errors
+            - variance uses Welford's mean and sum of squared differences (m2), updated when a value is added and
+              when one leaves the window, and also recalculated every N appends
+            - min and max are monotonic queues of (index, value), the first one is always the answer
+        :return:
+        """
+        self.total          = 0.0
+        self.mean           = 0.0
+        self.m2             = 0.0
+        self.appended       = 0   # number of values appended since reset, used as index in the candidates
+        self.since_exact    = 0   # appends since the last exact sum
+        self.min_candidates = deque()
+        self.max_candidates = deque()
+
+    def rebuild_aggregates(self):
+        """
+        Recalculates all the aggregates from the values in the window
+        :return:
+        """
+        values   = list(self.values)
+        appended = max(self.appended, len(values))  # keep the indexes, they are also used by the optimums
+        self.reset_aggregates()
+        self.total    = self.exact_sum()
+        self.mean, self.m2 = self.exact_moments()
+        self.appended = appended
+        first_index   = appended - len(values)
+        for i, value in enumerate(values):
+            push_candidate(self.min_candidates, first_index + i, value, is_min=True)
+            push_candidate(self.max_candidates, first_index + i, value, is_min=False)
+
+    def add_to_aggregates(self, value, evicted):
+        index          = self.appended
+        self.appended += 1
+
+        self.total += value if evicted is None else value - evicted
+        if evicted is None:
+            delta      = value - self.mean
+            self.mean += delta/len(self.values)
+            self.m2   += delta*(value - self.mean)
+        else:
+            self.replace_in_moments(value, evicted)
+        self.since_exact += 1
+        if self.since_exact >= self.length:
+            self.total         = self.exact_sum()
+            self.mean, self.m2 = self.exact_moments()
+            self.since_exact   = 0
+
+        first_index = self.appended - len(self.values)
+        for candidates, is_min in [[self.min_candidates, True], [self.max_candidates, False]]:
+            push_candidate(candidates, index, value, is_min)
+            while candidates[0][0] < first_index:
+                candidates.popleft()
+
+    def update_aggregates(self, value, old_value):
+        self.total += value - old_value
+        self.replace_in_moments(value, old_value)
+        index = self.appended - 1
+        for candidates, is_min in [[self.min_candidates, True], [self.max_candidates, False]]:
+            if (value > old_value) if is_min else (value < old_value):
+                # values discarded because of old_value could be candidates again
+                self.rebuild_aggregates()
+                return
+            candidates.pop()  # the last value is always the last candidate
+            push_candidate(candidates, index, value, is_min)
+
+    def replace_in_moments(self, value, old_value):
+        """
+        Welford update when a value replaces another one (the number of values does not change)
+        """
+        old_mean   = self.mean
+        self.mean += (value - old_value)/len(self.values)
+        self.m2   += (value - old_value)*(value - self.mean + old_value - old_mean)
+
+    def exact_sum(self):
+        return math.fsum(self.values)
+
+    def exact_moments(self):
+        """
+        Returns the mean and the sum of squared differences from it, calculated from scratch
+        """
+        values = self.get_array()
+        if len(values) == 0:
+            return 0.0, 0.0
+        mean = float(values.mean())
+        return mean, float(np.square(values - mean).sum())
     # end aggregates
 
-    def local_optimum_points(self):
-        # returns the points where there are a local min or max
-        dif = 0.1
-        points = []
-        for i in range(2, len(self.values)):
-            d1 = self.values[i-1] - self.values[i-2]
-            d2 = self.values[i]   - self.values[i-1]
-            if d2 < -dif:
-                if d1 > dif:
-                    # local max
-                    points.append((i, self.values[i-1], 1))  # 1 means max
-            else:
-                if d1 < -dif:
-                    # local min
-                    points.append((i, self.values[i-1], -1))  # -1 means min
-        return points
-
-    def changed_derivative(self):
+    def local_optimum_points(self, threshold=None):
+        """
+        Returns the points where there is a local min or max
+        :param threshold: if None the one given at creation is used
+        :return: list of (i, value, kind), where kind is 1 for max and -1 for min
+        """
+        threshold = self.threshold if threshold is None else threshold
+        if self.track_optimums and threshold == self.threshold:
+            first_index = self.appended - len(self.values)
+            return [(index - first_index, value, kind) for index, value, kind in self.optimums]
+        return optimum_points(self.get_array(), threshold)
+
+    def changed_derivative(self, threshold=None):
         """
         Returns True if values changed derivative in the period
+        :param threshold: if None the one given at creation is used
         :return: :type boolean
         """
-        for i in range(2, len(self.values)):
-            d1 = self.values[i-1] - self.values[i-2]
-            d2 = self.values[i]   - self.values[i-1]
-            if abs(d2-d1) > 0.1:  # not np.sign(d1) == np.sign(d2):
-                # print 'd:%s' %(d2-d1)
-                return True
-        return False
+        threshold = self.threshold if threshold is None else threshold
+        if self.track_optimums and threshold == self.threshold:
+            return len(self.derivative_changes) > 0
+        return derivative_changed(self.get_array(), threshold)
+
+    def reset_optimums(self):
+        self.optimums           = deque()  # (index, value, kind), where index is the one of the last value used
+        self.derivative_changes = deque()  # indexes
+
+    def rebuild_optimums(self):
+        self.reset_optimums()
+        if not self.track_optimums:
+            return
+        values      = self.get_array()
+        first_index = self.appended - len(values)
+        for i, value, kind in optimum_points(values, self.threshold):
+            self.optimums.append((first_index + i, value, kind))
+        changes = np.flatnonzero(np.abs(np.diff(values, 2)) > self.threshold) + 2
+        self.derivative_changes.extend((first_index + changes).tolist())
+
+    def check_optimums(self, replace_last=False):
+        """
+        Updates the local optimums and derivative changes with the last value, without scanning the whole history
+        :param replace_last: True when the last value was replaced (see update)
+        :return:
+        """
+        index = self.appended - 1
+        if replace_last:
+            if self.optimums and self.optimums[-1][0] == index:
+                self.optimums.pop()
+            if self.derivative_changes and self.derivative_changes[-1] == index:
+                self.derivative_changes.pop()
+
+        # discard the ones whose values are not in the history anymore
+        first_index = self.appended - len(self.values) + 2
+        while self.optimums and self.optimums[0][0] < first_index:
+            self.optimums.popleft()
+        while self.derivative_changes and self.derivative_changes[0] < first_index:
+            self.derivative_changes.popleft()
+
+        if len(self.values) < 3:
+            return
+        v0, v1, v2 = self.values[-3], self.values[-2], self.values[-1]
+        d1, d2     = v1 - v0, v2 - v1
+        kind       = optimum_kind(d1, d2, self.threshold)
+        if kind != 0:
+            self.optimums.append((index, v1, kind))
+        if abs(d2 - d1) > self.threshold:
+            self.derivative_changes.append(index)
+
+
+class ArraySignalHistory(SignalHistory):
+    """
+    Store the last N values of a Signal in a preallocated float64 buffer
+    Notes:
+        - every value is written twice (at i and i + length), so the window is always a contiguous slice of the
+          buffer and values returns a view of it (no copy, no conversion when plotting)
+        - append and update are O(1), load copies the values in just one numpy operation
+    """
+
+    def __init__(self, length=10, threshold=0.1, track_optimums=False):
+        self.length         = length + 1
+        self.threshold      = threshold
+        self.track_optimums = track_optimums
+        self.buffer = None  # just to avoid warnings
+        self.head   = 0     # position where the next value will be written
+        self.count  = 0     # number of values in the window
+        self.reset()
+
+    @property
+    def values(self):
+        start = (self.head - self.count) % self.length
+        return self.buffer[start:start + self.count]
+
+    def reset(self):
+        self.buffer = np.zeros(2*self.length, dtype=np.float64)
+        self.head   = 0
+        self.count  = 0
+        self.reset_aggregates()
+        self.reset_optimums()
+
+    def append(self, value):
+        evicted = self.buffer[self.head] if self.is_full() else None
+        self.buffer[self.head]               = value
+        self.buffer[self.head + self.length] = value
+        self.head  = (self.head + 1) % self.length
+        self.count = min(self.count + 1, self.length)
+        self.add_to_aggregates(value, evicted)
+        if self.track_optimums:
+            self.check_optimums()
+
+    def update(self, value):
+        """
+        Change the last value
+        :param value:
+        :return:
+        """
+        if self.count == 0:
+            raise IndexError('update of an empty history')  # as SignalHistory.update (pop from an empty deque)
+        last      = (self.head - 1) % self.length
+        old_value = self.buffer[last]
+        self.buffer[last]               = value
+        self.buffer[last + self.length] = value
+        self.update_aggregates(value, old_value)
+        if self.track_optimums:
+            self.check_optimums(replace_last=True)
+
+    def load(self, values):
+        """
+        Bulk store values (only the last N are kept). Used to load from telemetry
+        :param values:
+        :return:
+        """
+        self.reset()
+        values = np.asarray(values, dtype=np.float64)[-self.length:]
+        count  = len(values)
+        self.buffer[:count]                          = values
+        self.buffer[self.length:self.length + count] = values
+        self.head  = count % self.length
+        self.count = count
+        self.rebuild_aggregates()
+        self.rebuild_optimums()
+
+    def is_full(self):
+        return self.count >= self.length
+
+    def get_items_in_lifo_order(self):
+        """
+        Returns item in Last In - First Out order
+        :return:
+        """
+        for v in self.values[::-1]:
+            yield v
+
+    def get_items_in_fifo_order(self):
+        """
+        Returns item in First In - First Out order
+        :return:
+        """
+        for v in self.values:
+            yield v
+
+    def last(self):
+        return self.values[-1]
+
+    def exact_sum(self):
+        return float(self.values.sum())
+
+    def get_array(self, lifo_order=False):
+        return self.values[::-1] if lifo_order else self.values
+
+
+class MultiSignalHistory(object):
+    """
+    Store the last N values of many Signals that share the time, in a single 2D buffer
+        row 0 is the time, row i + 1 is the channel i
+    Notes:
+        - like ArraySignalHistory every value is written twice, so each row of the window is a contiguous view
+        - one append per sample stores all the channels
+    """
+
+    def __init__(self, length=10, channels=1):
+        self.length   = length + 1
+        self.channels = channels
+        self.buffer   = None  # just to avoid warnings
+        self.head     = 0
+        self.count    = 0
+        self.reset()
+
+    def reset(self):
+        self.buffer = np.zeros((self.channels + 1, 2*self.length), dtype=np.float64)
+        self.head   = 0
+        self.count  = 0
+
+    def get_len(self):
+        return self.length
+
+    def get_count(self):
+        return self.count
+
+    def is_full(self):
+        return self.count >= self.length
+
+    def append(self, x, ys):
+        """
+        Stores a new sample for all the channels
+        :param x:  time
+        :param ys: one value per channel
+        :return:
+        """
+        self.buffer[0, self.head]                  = x
+        self.buffer[1:, self.head]                 = ys
+        self.buffer[:, self.head + self.length]    = self.buffer[:, self.head]
+        self.head  = (self.head + 1) % self.length
+        self.count = min(self.count + 1, self.length)
+
+    def append_rows(self, xs, ys):
+        """
+        Stores many samples at once (only the last N are kept)
+        :param xs: array of times
+        :param ys: matrix with a row per channel and a column per sample
+        :return:
+        """
+        samples = len(xs)
+        if samples == 0:
+            return
+        kept      = min(samples, self.length)
+        positions = (self.head + samples - kept + np.arange(kept)) % self.length
+        self.buffer[0, positions]                = xs[-kept:]
+        self.buffer[1:, positions]               = np.asarray(ys)[:, -kept:]
+        self.buffer[:, positions + self.length]  = self.buffer[:, positions]
+        self.head  = (self.head + samples) % self.length
+        self.count = min(self.count + samples, self.length)
+
+    def window(self):
+        """
+        Returns a view of the stored values, row 0 is the time and row i + 1 the channel i (oldest value first)
+        :return:
+        """
+        start = (self.head - self.count) % self.length
+        return self.buffer[:, start:start + self.count]
+
+    def get_time(self):
+        return self.window()[0]
+
+    def get_channel(self, channel):
+        return self.window()[channel + 1]
+
+    def last_time(self):
+        return self.buffer[0, (self.head - 1) % self.length]
+
+
+class MappedSignalHistory(object):
+    """
+    A window of a signal file (see record.SignalRecorder) of any size, used to scrub through long logs
+    (ex: the window start given by a Slider)
+    Notes:
+        - the file is mapped in memory, only the rows of the window are read, and copied into a preallocated buffer,
+          then the mapped pages are released, so the memory used depends on the window length, not on the file size
+        - seek does a binary search on the mapped times (np.searchsorted would copy the whole time column)
+        - it has the same interface as MultiSignalHistory (row 0 is the time, row i + 1 the channel i)
+    """
+
+    def __init__(self, file_name, length=1000):
+        """
+        :param file_name: file written by record.SignalRecorder
+        :param length:    number of rows in the window
+        """
+        self.data     = rc.read_signal_file(file_name)
+        self.times    = self.data[:, 0]
+        self.channels = self.data.shape[1] - 1
+        self.length   = min(length, len(self.data))
+        self.buffer   = np.zeros((self.channels + 1, self.length), dtype=np.float64)
+        self.start    = 0
+        self.seek_row(0)
+
+    def get_len(self):
+        return self.length
+
+    def get_count(self):
+        return self.length
+
+    def get_rows(self):
+        """
+        Returns the number of rows in the file
+        """
+        return len(self.data)
+
+    def get_time_range(self):
+        """
+        Returns the first and last time of the file (ex: to set the min and max of a Slider)
+        """
+        if len(self.times) == 0:
+            return 0.0, 0.0
+        return self.times[0], self.times[-1]
+
+    def seek(self, t):
+        """
+        Moves the window so it starts at time t
+        :param t:
+        :return:
+        """
+        self.seek_row(bisect.bisect_left(self.times, t))
+
+    def seek_row(self, row):
+        """
+        Moves the window so it starts at the given row (the window is kept inside the file)
+        :param row:
+        :return:
+        """
+        self.start = max(0, min(row, len(self.data) - self.length))
+        np.copyto(self.buffer.T, self.data[self.start:self.start + self.length])
+        rc.release_signal_file(self.data)
+
+    def window(self):
+        return self.buffer
+
+    def get_time(self):
+        return self.buffer[0]
+
+    def get_channel(self, channel):
+        return self.buffer[channel + 1]
+
+    def last_time(self):
+        return self.buffer[0, -1] if self.length > 0 else 0.0
+
+
+class PyramidSignalHistory(object):
+    """
+    Store all the values of a long Signal with a min/max pyramid, so any range can be shown with about the same
+    number of points, without losing spikes
+        level 0 has the values, each item of level i + 1 has the min and max of factor items of level i
+    Notes:
+        - the levels are updated in every append (only the new complete buckets are calculated)
+        - get_range picks the lowest level with no more items than the points asked (ex: the pixels of a figure), so a
+          zoomed out view costs the same as a zoomed in one
+    """
+
+    def __init__(self, factor=4, capacity=1024):
+        """
+        :param factor:   number of items of a level aggregated in each item of the next one
+        :param capacity: initial capacity of each level (it grows as needed)
+        """
+        self.factor   = factor
+        self.capacity = capacity
+        self.levels   = None  # just to avoid warnings
+        self.reset()
+
+    def reset(self):
+        self.levels = [PyramidLevel(self.capacity)]
+
+    def get_count(self):
+        return self.levels[0].count
+
+    def get_levels(self):
+        return len(self.levels)
+
+    def append(self, x, y):
+        self.append_rows(np.array([x], dtype=np.float64), np.array([y], dtype=np.float64))
+
+    def append_rows(self, xs, ys):
+        """
+        :param xs: array of times (increasing)
+        :param ys: array of values
+        :return:
+        """
+        self.levels[0].extend(xs, ys, ys)
+        # while a level gets new items the next one can have new complete buckets (or be created)
+        i = 1
+        while True:
+            lower    = self.levels[i - 1]
+            complete = lower.count // self.factor
+            if complete == 0:
+                break
+            if i == len(self.levels):
+                self.levels.append(PyramidLevel(max(self.capacity // self.factor, 16)))
+            upper = self.levels[i]
+            if complete == upper.count:
+                break
+            start, end = upper.count*self.factor, complete*self.factor
+            upper.extend(lower.times[start:end:self.factor],
+                         lower.mins[start:end].reshape(-1, self.factor).min(axis=1),
+                         lower.maxs[start:end].reshape(-1, self.factor).max(axis=1))
+            i += 1
+
+    def get_range(self, x_min=None, x_max=None, max_points=1000):
+        """
+        Returns the values between x_min and x_max, with no more than about max_points
+        :param x_min: None means from the first one
+        :param x_max: None means up to the last one
+        :param max_points:
+        :return: xs, ys (at levels above 0 each item gives two points: its min and max)
+        """
+        level = self.get_level(x_min, x_max, max_points)
+        xs, mins, maxs = [], [], []
+        # items of the level, then the ones of the levels below not aggregated yet (the most recent ones)
+        for i in range(level, -1, -1):
+            first = 0 if i == level else self.levels[i + 1].count*self.factor
+            times, level_mins, level_maxs = self.levels[i].items(first, x_min, x_max)
+            xs.append(times)
+            mins.append(level_mins)
+            maxs.append(level_maxs)
+        xs, mins, maxs = np.concatenate(xs), np.concatenate(mins), np.concatenate(maxs)
+        if level == 0:
+            return xs, mins
+        return np.repeat(xs, 2), np.column_stack([mins, maxs]).ravel()
+
+    def get_level(self, x_min, x_max, max_points):
+        """
+        Returns the lowest level with less than max_points/2 items between x_min and x_max (max_points at level 0)
+        """
+        count = self.levels[0].count_between(x_min, x_max)
+        if count <= max_points:
+            return 0
+        level = int(math.ceil(math.log(count/(max(max_points, 2)/2.0), self.factor)))
+        return min(level, len(self.levels) - 1)
+
+
+class PyramidLevel(object):
+    """
+    Items (time, min and max) of a level of PyramidSignalHistory, in arrays that double their size when full
+    """
+
+    def __init__(self, capacity):
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.mins  = np.zeros(capacity, dtype=np.float64)
+        self.maxs  = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+
+    def extend(self, times, mins, maxs):
+        new_count = self.count + len(times)
+        if new_count > len(self.times):
+            capacity   = max(new_count, 2*len(self.times))
+            self.times = np.resize(self.times, capacity)
+            self.mins  = np.resize(self.mins, capacity)
+            self.maxs  = np.resize(self.maxs, capacity)
+        self.times[self.count:new_count] = times
+        self.mins[self.count:new_count]  = mins
+        self.maxs[self.count:new_count]  = maxs
+        self.count = new_count
+
+    def bounds(self, first, x_min, x_max):
+        """
+        Returns the positions of the items from first that are between x_min and x_max, including the ones just
+        outside (they are partially visible: the line goes to the border)
+        """
+        times = self.times[:self.count]
+        start = first if x_min is None else max(first, int(np.searchsorted(times, x_min, side='right')) - 1)
+        end   = self.count if x_max is None else min(self.count, int(np.searchsorted(times, x_max)) + 1)
+        return start, max(start, end)
+
+    def count_between(self, x_min, x_max):
+        start, end = self.bounds(0, x_min, x_max)
+        return end - start
+
+    def items(self, first, x_min, x_max):
+        """
+        Returns the items from first that are between x_min and x_max
+        """
+        start, end = self.bounds(first, x_min, x_max)
+        return self.times[start:end], self.mins[start:end], self.maxs[start:end]
+
+
+class FilterBank(object):
+    """
+    Applies many FIR filters to the same SignalHistory, useful to compare filter kernels live
+    Notes:
+        - the weights of all the filters are cached in a matrix (one row per filter), so all the outputs are calculated
+          with just one dot product
+        - the weights are applied like in SignalHistory.weighted_sum (by default the first weight goes with the last
+          value)
+    """
+
+    def __init__(self, history=None, length=10, lifo_order=True):
+        """
+        :param history:    SignalHistory to filter, if None an ArraySignalHistory of the given length is created
+        :param length:     length of the history (only used if history is None)
+        :param lifo_order: whether the first weight is applied to the last value or to the first one
+        """
+        self.history    = history if history is not None else ArraySignalHistory(length)
+        self.lifo_order = lifo_order
+        self.names      = []
+        self.kernels    = {}
+        self.weights    = None  # cached matrix, None means it must be built again
+
+    def add_filter(self, name, weights):
+        """
+        Register a filter (if the name already exists its weights are replaced)
+        :param name:
+        :param weights: list of weights, the ones beyond the history length are ignored
+        :return:
+        """
+        if name not in self.kernels:
+            self.names.append(name)
+        self.kernels[name] = np.asarray(weights, dtype=np.float64)
+        self.weights       = None
+
+    def remove_filter(self, name):
+        if name not in self.kernels:
+            return
+        self.names.remove(name)
+        del self.kernels[name]
+        self.weights = None
+
+    def get_names(self):
+        return self.names
+
+    def get_weights(self):
+        """
+        Returns the matrix of weights (one row per filter, padded with zeros up to the history length)
+        :return:
+        """
+        if self.weights is None:
+            length       = self.history.get_len()
+            self.weights = np.zeros((len(self.names), length), dtype=np.float64)
+            for i, name in enumerate(self.names):
+                kernel = self.kernels[name][:length]
+                self.weights[i, :len(kernel)] = kernel
+        return self.weights
+
+    def append(self, value):
+        """
+        Adds a new value to the history and returns the outputs of all the filters
+        :param value:
+        :return: array with one output per filter (in the order they were added)
+        """
+        self.history.append(value)
+        return self.outputs()
+
+    def outputs(self):
+        values = self.history.get_array(self.lifo_order)
+        return self.get_weights()[:, :len(values)].dot(values)
+
+    def outputs_by_name(self):
+        return dict(zip(self.names, self.outputs()))
+
+    def filter_values(self, values):
+        """
+        Filters a whole series in one call, the same result as appending each value to an empty history
+        :param values: list or array of values (ex: loaded from telemetry)
+        :return: matrix with a row per filter and a column per value
+        """
+        values  = np.asarray(values, dtype=np.float64)
+        weights = self.get_weights()
+        length  = weights.shape[1]
+        count   = len(values)
+        if count == 0:
+            return np.zeros((len(self.names), 0))
+
+        # every row of windows is the history after appending a value (oldest first, zeros while not full)
+        padded  = np.concatenate([np.zeros(length - 1), values])
+        stride  = padded.strides[0]
+        windows = np.lib.stride_tricks.as_strided(padded, shape=(count, length), strides=(stride, stride))
+        if self.lifo_order:
+            return weights.dot(windows[:, ::-1].T)
+
+        outputs = weights.dot(windows.T)
+        for i in range(min(length - 1, count)):
+            # while the history is not full the first weight goes with the first value
+            outputs[:, i] = weights[:, :i + 1].dot(values[:i + 1])
+        return outputs
+
+    def filter_history(self):
+        return self.filter_values(self.history.values)
+
+
+def optimum_kind(d1, d2, threshold):
+    """
+    Returns whether the middle of three values is a local max (1), a local min (-1) or none of them (0)
+    :param d1: difference between the second and the first value
+    :param d2: difference between the third and the second value
+    :param threshold:
+    :return:
+    """
+    if d2 < -threshold:
+        return 1 if d1 > threshold else 0
+    return -1 if d1 < -threshold else 0
+
+
+def optimum_points(values, threshold=0.1):
+    """
+    Vectorized version of optimum_kind applied to all the values
+    :param values: numpy array
+    :param threshold:
+    :return: list of (i, value, kind), where i is the index of the value after the optimum
+    """
+    dif    = np.diff(values)
+    d1, d2 = dif[:-1], dif[1:]
+    kinds  = np.where(d2 < -threshold, np.where(d1 > threshold, 1, 0), np.where(d1 < -threshold, -1, 0))
+    points = np.flatnonzero(kinds)
+    return list(zip((points + 2).tolist(), values[points + 1].tolist(), kinds[points].tolist()))
+
+
+def derivative_changed(values, threshold=0.1):
+    return bool(np.any(np.abs(np.diff(values, 2)) > threshold))
+
+
+def push_candidate(candidates, index, value, is_min):
+    """
+    Adds a value to a monotonic queue, removing the previous values that can never be the min (or max) again
+    :param candidates: deque of (index, value)
+    :param index:
+    :param value:
+    :param is_min:     True for a min queue, False for a max queue
+    :return:
+    """
+    if is_min:
+        while candidates and candidates[-1][1] >= value:
+            candidates.pop()
+    else:
+        while candidates and candidates[-1][1] <= value:
+            candidates.pop()
+    candidates.append((index, value))
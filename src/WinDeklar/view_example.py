@@ -3,6 +3,8 @@
 import sys
 import time
 
+import numpy as np
+
 import WinDeklar.WindowForm as WinForm
 import WinDeklar.graph_aux as ga
 import WinDeklar.QTAux as QTAux
@@ -62,11 +64,12 @@ class ExampleHost(WinForm.HostModel):
         """
         if figure.name == self.graph1_key:
             function_name = self.get_value(self.type_key)
-            points        = self.get_graph_points(function_name)
+            xs, ys        = self.get_graph_arrays(function_name)
             show_axis     = [True, True] if self.get_value(self.axis_key) else [False, False]
-            ga.graph_points(ax, points, x_visible=show_axis[0], y_visible=show_axis[1],
-                            line_width=self.get_value(self.width_key, default=1.0))
-            figure.resize_axis(points)
+            # graph1 is retained (see yaml), so the line is created once and then its values are changed
+            ga.graph_xy(ax, xs, ys, x_visible=show_axis[0], y_visible=show_axis[1],
+                        line_width=self.get_value(self.width_key, default=1.0), artist=figure.line('graph'))
+            figure.resize_axis(ga.xy_bounds(xs, ys))
         elif figure.name == self.graph2_key:
             number_of_points = int(self.get_value(self.points_key, default=10))
             p1 = [number_of_points, number_of_points]
@@ -80,6 +83,7 @@ class ExampleHost(WinForm.HostModel):
         Event defined in the yaml file to be called when button redraw is pressed
         :return:
         """
+        self.invalidate_figures()
         self.refresh()
 
     def initialize(self):
@@ -164,17 +168,24 @@ class ExampleHost(WinForm.HostModel):
         msg = '%s saved' % file_name
         self.show_status_bar_msg(msg)
 
-    def get_graph_points(self, function_name):
+    def get_graph_types(self):
+        """
+        Values of the graph type combo: the functions registered in graph_aux (Other is not, to show the message)
+        :return:
+        """
+        return ga.get_function_names() + ['Other']
+
+    def get_graph_arrays(self, function_name):
         """
-        Returns the points (x,y) to be graphed depending on the graph type and number of points
+        Returns the values (xs, ys) to be graphed depending on the graph type and number of points
         :return:
         """
         number_of_points = int(self.get_value(self.points_key, default=10))
-        points, msg      = ga.graph_points_for_many_functions(function_name, number_of_points)
-        if points is None:
-            self.show_status_bar_msg('%s not implemented' % function_name)
-            points = []
-        return points
+        xs, ys           = ga.graph_arrays_for_many_functions(function_name, number_of_points)
+        if xs is None:
+            self.show_status_bar_msg(ys)
+            xs, ys = np.zeros(0), np.zeros(0)
+        return xs, ys
 
 
 def progress_bar_example(progress_bar, max_value=100, inc=20, sleep_time=0.2):
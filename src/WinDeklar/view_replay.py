@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+import os
+import sys
+
+import numpy as np
+
+import WinDeklar.WindowForm as WinForm
+import WinDeklar.QTAux as QTAux
+import WinDeklar.record as rc
+import WinDeklar.signal_aux as sg
+
+
+class ReplayHost(WinForm.HostModel):
+    """
+    Example of scrubbing through a long log (a file written by record.SignalRecorder) with a Slider
+    Notes:
+        - the graph shows a window of the file (see signal_aux.MappedSignalHistory), when the position changes only
+          the rows of the window are read, so it takes the same time and memory whatever the file size
+        - the graph is retained (see yaml), its lines are created once and then their values are changed
+    """
+
+    def __init__(self, file_name=None, window=2000, colors=('Blue', 'Red', 'Green', 'Black'),
+                 default_directory='/tmp', file_extension='sig'):
+        """
+        :param file_name: signal file to show, if None an example is created
+        :param window:    number of rows shown
+        :param colors:    color of each channel
+        """
+        # keys (names used in the yaml definition file)
+        self.position_key = 'position'
+        self.graph_key    = 'graph'
+
+        # particular data
+        self.window         = window
+        self.colors         = colors
+        self.positions      = 1000.0  # max value of the position slider (see yaml)
+        self.history        = None
+        self.directory      = default_directory
+        self.file_extension = file_extension
+        self.file_filter    = '*.%s' % self.file_extension
+        self.file_name      = None
+        self.open_signal_file(file_name if file_name is not None else create_example_file(default_directory))
+
+        initial_values = {}
+        super(ReplayHost, self).__init__(initial_values=initial_values)
+
+    def open_signal_file(self, file_name):
+        self.history   = sg.MappedSignalHistory(file_name, length=self.window)
+        self.file_name = file_name
+
+    def widget_changed(self, name, value):
+        """
+        Moves the window to the position chosen (as a fraction of the file time), update_view shows it
+        :param name:
+        :param value:
+        :return:
+        """
+        if name == self.position_key:
+            first, last = self.history.get_time_range()
+            self.history.seek(first + (last - first)*value/self.positions)
+
+    def update_view(self, figure, ax):
+        if figure.name == self.graph_key:
+            xs = self.history.get_time()
+            for channel in range(self.history.channels):
+                line = figure.line('channel%s' % channel, color=self.colors[channel % len(self.colors)])
+                line.set_data(xs, self.history.get_channel(channel))
+            # the x-axis is the window (resize_axis would scale it around the origin)
+            if len(xs) > 0:
+                ys     = self.history.window()[1:]
+                margin = 0.05*(ys.max() - ys.min()) or 0.5  # a flat window is not collapsed
+                ax.set_xlim(xs[0], xs[-1])
+                ax.set_ylim(ys.min() - margin, ys.max() + margin)
+            self.show_status_bar_msg('%s: rows %s to %s of %s' % (os.path.basename(self.file_name),
+                                                                  self.history.start,
+                                                                  self.history.start + self.history.get_len(),
+                                                                  self.history.get_rows()))
+
+    # actions
+    def event_open_file(self):
+        file_name = self.get_file_name(title='Open a signal file', file_filter=self.file_filter,
+                                       directory=self.directory)
+        if file_name is None:
+            return
+        self.open_signal_file(file_name)
+        self.set_value(self.position_key, 0.0)
+        self.refresh_widget(self.position_key)
+
+
+def create_example_file(directory, rows=1000000, dt=0.001, chunk=100000):
+    """
+    Writes (just once) a log of two noisy sine waves to scrub through
+    :param directory:
+    :param rows:
+    :param dt:
+    :param chunk: rows written at a time
+    :return: the file name
+    """
+    recorder  = rc.SignalRecorder('replay_example', channels=2, dir=directory, add_time_stamp=False)
+    file_name = recorder.get_full_file_name()
+    if os.path.exists(file_name):
+        return file_name
+    rng = np.random.default_rng(0)
+    for start in range(0, rows, chunk):
+        xs = np.arange(start, min(start + chunk, rows))*dt
+        ys = np.vstack([np.sin(xs), 0.5*np.cos(xs/3.0)]) + rng.normal(scale=0.05, size=(2, len(xs)))
+        recorder.append_rows(xs, ys)
+    recorder.close()
+    return file_name
+
+
+if __name__ == '__main__':
+    app = QTAux.def_app()
+    provider = ReplayHost(sys.argv[1] if len(sys.argv) > 1 else None)  # class to handle the WinForm logic
+    WinForm.run_winform(__file__, provider)
+    sys.exit(app.exec_())
@@ -11,11 +11,11 @@ def show_simple_window(title='Sine and Cosine graph', number_of_points=100, size
 
 
 def graph_one_function(function_name, ax, number_of_points, color):
-    points, msg = ga.graph_points_for_many_functions(function_name, number_of_points)
-    if points is None:
-        print('%s not implemented' % function_name)
+    xs, ys = ga.graph_arrays_for_many_functions(function_name, number_of_points)
+    if xs is None:
+        print(ys)
         return
-    ga.graph_points(ax, points, color=color)
+    ga.graph_xy(ax, xs, ys, color=color)
 
 
 if __name__ == '__main__':
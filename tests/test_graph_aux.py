@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+import WinDeklar.graph_aux as ga
+
+
+def test_providers_follow_the_clock():
+    clock    = ga.SimulatedClock()
+    provider = ga.RealTimeFunctionDataProvider(dt=0.01, function=np.sin, max_samples=500)
+    provider.clock = clock
+    xs, _ = provider.get_available_values()
+    assert len(xs) == 1
+
+    for elapsed in [0.1, 0.5, 0.03, 0.0]:  # frames of any length produce the samples of the time elapsed
+        clock.advance(elapsed)
+        previous = provider.t
+        xs, ys   = provider.get_available_values()
+        assert len(xs) == int(round(elapsed/0.01))
+        assert np.allclose(xs, previous + 0.01*np.arange(len(xs)))
+        assert np.allclose(ys, np.sin(np.radians(10)*np.round(xs/0.01)))
+    assert abs(provider.t - (clock() + 0.01)) < 1e-9
+
+    # after a long stall only max_samples are produced, the older ones are skipped
+    clock.advance(10.0)
+    xs, _ = provider.get_available_values()
+    assert len(xs) == 500
+    assert abs(xs[-1] - clock()) < 1e-9
+
+    # the time stopped is not produced, it continues with the next sample (as when it started)
+    provider.stop()
+    clock.advance(5.0)
+    provider.start()
+    previous = provider.t
+    xs, _ = provider.get_available_values()
+    assert len(xs) == 1 and xs[0] == previous
+    clock.advance(0.05)
+    xs, _ = provider.get_available_values()
+    assert len(xs) == 5
+
+
+def test_fixed_samples_per_frame():
+    provider = ga.RealTimeConstantDataProvider(dt=0.1, samples_per_frame=3)
+    for _ in range(4):
+        xs, ys = provider.get_available_values()
+        assert len(xs) == 3
+    assert abs(provider.t - 1.2) < 1e-9
+
+
+def test_decimate():
+    rng = np.random.default_rng(6)
+    xs  = np.arange(100000, dtype=np.float64)*0.001
+    ys  = np.sin(xs) + 0.01*rng.normal(size=len(xs))
+    ys[4321] = 5.0  # a spike
+
+    few_xs, few_ys = xs[:100], ys[:100]
+    decimated_xs, decimated_ys = ga.decimate(few_xs, few_ys, 2000)
+    assert decimated_xs is few_xs and decimated_ys is few_ys
+
+    minmax_xs, minmax_ys = ga.decimate(xs, ys, 2000, method='minmax')
+    assert len(minmax_xs) <= 2000
+    assert np.all(np.diff(minmax_xs) >= 0)
+    assert minmax_ys.max() == 5.0 and minmax_ys.min() == ys.min()
+
+    lttb_xs, lttb_ys = ga.decimate(xs, ys, 2000, method='lttb')
+    assert len(lttb_xs) == 2000
+    assert lttb_xs[0] == xs[0] and lttb_xs[-1] == xs[-1]
+    assert np.all(np.diff(lttb_xs) > 0)
+    assert 5.0 in lttb_ys
+    # it differs from the exact one about the noise
+    exact_xs, exact_ys = ga.lttb_decimation(xs, ys, 2000)
+    assert np.abs(np.interp(xs, lttb_xs, lttb_ys) - np.interp(xs, exact_xs, exact_ys)).mean() < 0.02
+
+    # the points chosen by the exact one are in the series, in order
+    assert np.all(np.isin(exact_xs, xs)) and np.all(np.diff(exact_xs) > 0)
+
+
+def test_statistics_bands_equal_scanned_windows():
+    from matplotlib.figure import Figure
+    rng   = np.random.default_rng(6)
+    ys    = np.cumsum(rng.normal(size=500)) + 1000.0
+    bands = ga.StatisticsBands(Figure().add_subplot(), length=len(ys), window=15)
+    start = 0
+    for samples in [1, 3, 14, 0, 40, 200, 242]:  # batches shorter and longer than the window
+        bands.append(np.arange(start, start + samples, dtype=np.float64), ys[start:start + samples])
+        start += samples
+
+    statistics = bands.values.window()[1:]
+    for i in range(len(ys)):
+        window = ys[max(0, i - 14):i + 1]
+        assert statistics[0, i] == pytest.approx(window.mean(), abs=1e-7)
+        assert statistics[1, i] == pytest.approx(window.std(), abs=1e-7)
+        assert statistics[2, i] == window.min()
+        assert statistics[3, i] == window.max()
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+import WinDeklar.signal_aux as sg
+
+
+def test_pyramid_bulk_append_equals_chunked():
+    xs = np.arange(2000000, dtype=np.float64)
+    ys = np.sin(xs/1000.0) + np.random.default_rng(0).normal(size=len(xs))
+
+    bulk = sg.PyramidSignalHistory(factor=4)
+    bulk.append_rows(xs, ys)
+    chunked = sg.PyramidSignalHistory(factor=4)
+    for start in range(0, len(xs), 1000):
+        chunked.append_rows(xs[start:start + 1000], ys[start:start + 1000])
+
+    assert bulk.get_levels() == chunked.get_levels()
+    for bulk_level, chunked_level in zip(bulk.levels, chunked.levels):
+        assert bulk_level.count == chunked_level.count
+        assert np.array_equal(bulk_level.mins[:bulk_level.count], chunked_level.mins[:chunked_level.count])
+        assert np.array_equal(bulk_level.maxs[:bulk_level.count], chunked_level.maxs[:chunked_level.count])
+
+    bulk_xs, bulk_ys       = bulk.get_range(None, None, 2000)
+    chunked_xs, chunked_ys = chunked.get_range(None, None, 2000)
+    assert len(bulk_xs) <= 2000
+    assert np.array_equal(bulk_xs, chunked_xs)
+    assert np.array_equal(bulk_ys, chunked_ys)
+
+
+def test_pyramid_keeps_spikes():
+    xs = np.arange(100000, dtype=np.float64)
+    ys = np.zeros(len(xs))
+    ys[12345] = 10.0
+    ys[54321] = -10.0
+    pyramid = sg.PyramidSignalHistory(factor=4)
+    pyramid.append_rows(xs, ys)
+
+    range_xs, range_ys = pyramid.get_range(None, None, 500)
+    assert len(range_xs) <= 500
+    assert range_ys.max() == 10.0
+    assert range_ys.min() == -10.0
+
+
+def test_update_of_empty_history_fails():
+    for history in [sg.SignalHistory(length=5), sg.ArraySignalHistory(length=5)]:
+        with pytest.raises(IndexError):
+            history.update(1.0)
+        assert history.average() == 0
+        history.append(2.0)
+        history.update(3.0)
+        assert history.average() == 3.0
+        assert history.variance() == 0.0
+
+
+def check_aggregates(history):
+    values = history.get_array()
+    assert history.sum() == pytest.approx(values.sum())
+    assert history.average() == pytest.approx(values.mean())
+    assert history.min() == values.min()
+    assert history.max() == values.max()
+    assert history.variance() == pytest.approx(values.var(), abs=1e-9)
+    assert history.std() == pytest.approx(values.std(), abs=1e-6)
+
+
+def test_incremental_aggregates_equal_exact_ones():
+    rng = np.random.default_rng(2)
+    for history in [sg.SignalHistory(length=7), sg.ArraySignalHistory(length=7)]:
+        for value in rng.normal(size=300)*100 + 1000:
+            if history.get_array().size > 0 and rng.random() < 0.3:
+                history.update(value)
+            else:
+                history.append(value)
+            check_aggregates(history)
+        history.load(rng.normal(size=20))
+        check_aggregates(history)
+
+
+def test_filter_values_equal_appending_each_value():
+    rng    = np.random.default_rng(3)
+    values = rng.normal(size=50)
+    for lifo_order in [True, False]:
+        bank = sg.FilterBank(length=8, lifo_order=lifo_order)
+        bank.add_filter('average', np.full(5, 1/5.0))
+        bank.add_filter('long', rng.normal(size=20))  # longer than the history
+        bank.add_filter('ramp', np.arange(9, dtype=np.float64))
+        outputs = np.array([bank.append(value) for value in values]).T
+        assert np.allclose(bank.filter_values(values), outputs)
+        assert bank.filter_values([]).shape == (3, 0)
+
+
+def test_tracked_optimums_equal_scanned_ones():
+    rng = np.random.default_rng(4)
+    tracked = sg.SignalHistory(length=12, threshold=0.3, track_optimums=True)
+    scanned = sg.ArraySignalHistory(length=12, threshold=0.3)
+    for value in np.cumsum(rng.normal(size=400)):
+        if len(tracked.values) > 0 and rng.random() < 0.2:
+            tracked.update(value)
+            scanned.update(value)
+        else:
+            tracked.append(value)
+            scanned.append(value)
+        assert tracked.local_optimum_points() == scanned.local_optimum_points()
+        assert tracked.changed_derivative() == scanned.changed_derivative()
+        # another threshold is always scanned
+        assert tracked.local_optimum_points(0.5) == scanned.local_optimum_points(0.5)
+
+
+def test_multi_signal_append_rows_equal_appending_each_sample():
+    rng      = np.random.default_rng(5)
+    rows     = sg.MultiSignalHistory(length=9, channels=3)
+    one_by_one = sg.MultiSignalHistory(length=9, channels=3)
+    time     = 0.0
+    for samples in [0, 1, 4, 9, 10, 3, 25, 7]:  # batches shorter and longer than the buffer, wrapping around
+        xs = time + np.arange(samples, dtype=np.float64)
+        ys = rng.normal(size=(3, samples))
+        time += samples
+        rows.append_rows(xs, ys)
+        for i in range(samples):
+            one_by_one.append(xs[i], ys[:, i])
+        assert rows.get_count() == one_by_one.get_count()
+        assert np.array_equal(rows.window(), one_by_one.window())
+        if samples > 0:
+            assert rows.last_time() == xs[-1]
+            assert np.array_equal(rows.get_channel(2)[-min(samples, 10):], ys[2, -10:])